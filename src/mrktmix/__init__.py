@@ -5,11 +5,21 @@ from mrktmix.data_create import parse_variable
 from mrktmix.data_create import reserve_dict
 from mrktmix.data_create import spread_notna
 from mrktmix.data_create import update_description
+from mrktmix.dataprep.cache import TransformCache
+from mrktmix.dataprep.matrix import TransformedMatrix
+from mrktmix.dataprep.panel import PanelLayout
+from mrktmix.dataprep.plan import TransformPlan
+from mrktmix.dataprep.summary import RangeSummary
 from mrktmix.optimization import mmm_optimize
+from mrktmix.streaming import StreamingApl
 from mrktmix.transformation import aggregate_data
 from mrktmix.transformation import apply_apl
+from mrktmix.transformation import apply_apl_memmap
 from mrktmix.transformation import apply_coef
 from mrktmix.transformation import assess_error
+from mrktmix.transformation import assess_models
 from mrktmix.transformation import collapse_date
 from mrktmix.transformation import create_base
 from mrktmix.transformation import segregate_data
+from mrktmix.transformation import summarize_coef
+from mrktmix.validation import backtest
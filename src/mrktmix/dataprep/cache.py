@@ -0,0 +1,82 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class TransformCache:
+    """ Least recently used cache for decayed and powered series. Decayed series are keyed on (column hash, adstock) and powered series
+    on (column hash, adstock, power). Cache evicts least recently used series once size of cached arrays exceeds byte budget
+
+    :param max_bytes: byte budget for cached arrays, defaults to 256 MiB
+    :type max_bytes: int, optional
+    """
+
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._store = OrderedDict()
+
+    def __len__(self):
+        return(len(self._store))
+
+    def __contains__(self, key):
+        return(key in self._store)
+
+    @staticmethod
+    def column_key(column):
+        """ Hash of column used as identity of column in cache keys
+
+        :param column: column with marketing or any other activities like spend
+        :type column: numpy.ndarray
+        :return: hash of data, shape and dtype of column
+        :rtype: string
+        """
+        column = np.ascontiguousarray(column)
+        digest = hashlib.blake2b(column.view(np.uint8), digest_size=16)
+        digest.update(str((column.shape, column.dtype.str)).encode())
+        return(digest.hexdigest())
+
+    def get(self, key):
+        """ Get cached array and mark it as recently used
+
+        :param key: cache key
+        :type key: tuple
+        :return: cached array or None if key is not present in cache
+        :rtype: numpy.ndarray or None
+        """
+        if key in self._store:
+            self.hits = self.hits + 1
+            self._store.move_to_end(key)
+            return(self._store[key])
+        self.misses = self.misses + 1
+        return(None)
+
+    def put(self, key, value):
+        """ Add array to cache and evict least recently used arrays beyond byte budget. Arrays bigger than byte budget are not cached
+
+        :param key: cache key
+        :type key: tuple
+        :param value: array to be cached. Cached array is made read only
+        :type value: numpy.ndarray
+        """
+        if key in self._store:
+            self.nbytes = self.nbytes - self._store.pop(key).nbytes
+        if value.nbytes > self.max_bytes:
+            return
+        value = np.array(value)
+        value.setflags(write=False)
+        self._store[key] = value
+        self.nbytes = self.nbytes + value.nbytes
+        while self.nbytes > self.max_bytes:
+            self.nbytes = self.nbytes - self._store.popitem(last=False)[1].nbytes
+
+    def clear(self):
+        """ Remove all arrays from cache and reset hit/miss counter
+        """
+        self._store.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
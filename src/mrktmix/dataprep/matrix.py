@@ -0,0 +1,185 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+SPEC_NAMES = ["Variable", "Adstock", "Power", "Lag"]
+
+
+class TransformedMatrix:
+    """ Transformed data as contiguous float array with one column for each spec. Spec of each column is kept in structured array with
+    fields Variable, Adstock, Power and Lag. It is compact alternative of DataFrame with 4-level multiindex column
+
+    :param values: array with row on axis 0 and spec on axis 1. Floating point type of array is kept
+    :type values: numpy.ndarray
+    :param spec: list of tuple of variable, adstock, power and lag or structured array of spec for each column of values
+    :type spec: list of tuple or numpy.ndarray
+    :param index: row index of values
+    :type index: pandas.Index
+    """
+
+    def __init__(self, values, spec, index):
+        self.values = values if isinstance(values, np.memmap) else np.ascontiguousarray(values)
+        if self.values.dtype.kind != "f":
+            self.values = self.values.astype(float)
+        self.spec = spec if isinstance(spec, np.ndarray) else spec_table(spec)
+        self.index = index
+        self._position = None
+        if self.values.shape != (len(self.index), len(self.spec)):
+            raise Exception('Mismatch of shape in values, spec and index')
+
+    def __len__(self):
+        return(len(self.values))
+
+    def __getitem__(self, key):
+        """ Values of given spec. List of spec returns 2-D array
+        """
+        return(self.values[:, self.position(key)])
+
+    @property
+    def shape(self):
+        return(self.values.shape)
+
+    @property
+    def columns(self):
+        """ Spec of columns as 4-level multiindex
+        """
+        return(spec_columns(self.spec))
+
+    @classmethod
+    def from_frame(cls, dframe, dtype=np.float64):
+        """ Create from DataFrame with tuple of variable, adstock, power and lag in column
+
+        :param dframe: DataFrame with tuple of variable, adstock, power and lag in column
+        :type dframe: pandas.DataFrame
+        :param dtype: floating point type of values, defaults to numpy.float64
+        :type dtype: numpy.dtype, optional
+        :return: transformed matrix
+        :rtype: mrktmix.TransformedMatrix
+        """
+        return(cls(dframe.to_numpy(dtype=dtype), [*dframe.columns], dframe.index))
+
+    @classmethod
+    def create_memmap(cls, path, spec, index, dtype=np.float64):
+        """ Create memory mapped file for values along with file of spec and row index (path with suffix .meta). Values are written
+        through returned matrix and must be flushed with flush
+
+        :param path: path of file
+        :type path: str
+        :param spec: list of tuple of variable, adstock, power and lag for each column
+        :type spec: list of tuple
+        :param index: row index of values
+        :type index: pandas.Index
+        :param dtype: floating point type of values, defaults to numpy.float64
+        :type dtype: numpy.dtype, optional
+        :return: transformed matrix with writable memory mapped values
+        :rtype: mrktmix.TransformedMatrix
+        """
+        spec = spec if isinstance(spec, np.ndarray) else spec_table(spec)
+        with open(str(path) + ".meta", "wb") as meta_file:
+            pickle.dump({"spec": spec, "index": index, "dtype": np.dtype(dtype).str}, meta_file)
+        values = np.memmap(path, dtype=dtype, mode="w+", shape=(len(index), len(spec)))
+        return(cls(values, spec, index))
+
+    @classmethod
+    def open_memmap(cls, path, mode="r"):
+        """ Open memory mapped file created by create_memmap without reading values into memory
+
+        :param path: path of file
+        :type path: str
+        :param mode: mode of memory map, defaults to read only 'r'
+        :type mode: str, optional
+        :return: transformed matrix with memory mapped values
+        :rtype: mrktmix.TransformedMatrix
+        """
+        with open(str(path) + ".meta", "rb") as meta_file:
+            meta = pickle.load(meta_file)
+        values = np.memmap(path, dtype=meta["dtype"], mode=mode, shape=(len(meta["index"]), len(meta["spec"])))
+        return(cls(values, meta["spec"], meta["index"]))
+
+    def flush(self):
+        """ Write changes of memory mapped values to file
+        """
+        if isinstance(self.values, np.memmap):
+            self.values.flush()
+
+    def position(self, key):
+        """ Position of column for given spec
+
+        :param key: tuple of variable, adstock, power and lag or list of tuples
+        :type key: Union[tuple, list]
+        :return: position of column
+        :rtype: Union[int, numpy.ndarray]
+        """
+        if self._position is None:
+            self._position = {spec: i for i, spec in enumerate(self.spec.tolist())}
+        if isinstance(key, tuple):
+            return(self._position[key])
+        return(np.array([self._position[tuple(spec)] for spec in key], dtype=int))
+
+    def select(self, all_vars=None, rows=None):
+        """ Subset of columns for given spec and subset of rows
+
+        :param all_vars: list of tuple of variable, adstock, power and lag. All columns are selected if None, defaults to None
+        :type all_vars: list of tuple, optional
+        :param rows: boolean mask or position of rows. All rows are selected if None, defaults to None
+        :type rows: numpy.ndarray, optional
+        :return: transformed matrix
+        :rtype: mrktmix.TransformedMatrix
+        """
+        columns = slice(None) if all_vars is None else self.position([*all_vars])
+        rows = slice(None) if rows is None else rows
+        return(TransformedMatrix(self.values[rows][:, columns], self.spec[columns], self.index[rows]))
+
+    def to_frame(self):
+        """ Convert to DataFrame with 4-level multiindex column
+
+        :return: DataFrame with tuple of variable, adstock, power and lag in column
+        :rtype: pandas.DataFrame
+        """
+        return(pd.DataFrame(self.values, index=self.index, columns=self.columns))
+
+
+def spec_table(all_vars):
+    """ Create structured array of spec from list of tuple of variable, adstock, power and lag
+
+    :param all_vars: list of tuple of variable, adstock, power and lag
+    :type all_vars: list of tuple
+    :return: structured array with fields Variable, Adstock, Power and Lag
+    :rtype: numpy.ndarray
+    """
+    all_vars = [*all_vars]
+    fields = [np.empty(len(all_vars), dtype=object)]
+    fields[0][:] = [var[0] for var in all_vars]
+    fields = fields + [field_array_([var[i] for var in all_vars]) if len(all_vars) else np.zeros(0) for i in range(1, 4)]
+    spec = np.empty(len(all_vars), dtype=[(name, field.dtype) for name, field in zip(SPEC_NAMES, fields)])
+    for name, field in zip(SPEC_NAMES, fields):
+        spec[name] = field
+    return(spec)
+
+
+def spec_columns(spec):
+    """ Create 4-level multiindex column from structured array of spec
+
+    :param spec: structured array with fields Variable, Adstock, Power and Lag
+    :type spec: numpy.ndarray
+    :return: multiindex with levels Variable, Adstock, Power and Lag
+    :rtype: pandas.MultiIndex
+    """
+    return(pd.MultiIndex.from_arrays([spec[name] for name in SPEC_NAMES], names=SPEC_NAMES))
+
+
+def field_array_(values):
+    """ Array of values of spec field. Field with tuple value (e.g. adstock kernel) is kept as object array
+
+    :param values: values of spec field
+    :type values: list
+    :return: array of values
+    :rtype: numpy.ndarray
+    """
+    if not any(isinstance(value, tuple) for value in values):
+        return(np.asarray(values))
+    field = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        field[i] = value
+    return(field)
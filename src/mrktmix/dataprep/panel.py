@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+
+class PanelLayout:
+    """ Panel data as contiguous array where periods of each panel are stored together. Boundary of panels is kept in offsets, i.e.
+    periods of i-th panel are rows offsets[i] to offsets[i + 1] of values. Panels can have different number of periods and start date,
+    and transformation restarts at each offset without grouping on row index
+
+    :param values: array with row on axis 0 and variable on axis 1
+    :type values: numpy.ndarray
+    :param offsets: first row of each panel followed by number of rows
+    :type offsets: numpy.ndarray
+    :param index: row index of values. Date must be at level -1 of row index and panel at remaining levels
+    :type index: pandas.MultiIndex
+    :param columns: column index of values
+    :type columns: pandas.Index
+    """
+
+    def __init__(self, values, offsets, index, columns):
+        self.values = np.ascontiguousarray(values)
+        self.offsets = np.asarray(offsets, dtype=int)
+        self.index = index
+        self.columns = columns
+        self.order = None
+        if ((self.values.shape != (len(self.index), len(self.columns))) or (self.offsets[0] != 0)
+                or (self.offsets[-1] != len(self.values)) or (np.diff(self.offsets) < 0).any()):
+            raise Exception('Mismatch of shape in values, offsets, index and columns')
+
+    def __len__(self):
+        return(len(self.values))
+
+    @property
+    def shape(self):
+        return(self.values.shape)
+
+    @property
+    def periods(self):
+        """ Number of periods in each panel
+        """
+        return(np.diff(self.offsets))
+
+    @property
+    def panels(self):
+        """ Name of each panel
+        """
+        return(self.index.droplevel(-1)[self.offsets[:-1][self.periods > 0]])
+
+    @property
+    def panel_index(self):
+        """ Position of panel for each row
+        """
+        return(np.repeat(np.arange(len(self.periods)), self.periods))
+
+    @property
+    def position(self):
+        """ Position of each row within its panel
+        """
+        return(np.arange(len(self)) - np.repeat(self.offsets[:-1], self.periods))
+
+    @classmethod
+    def from_frame(cls, dframe, dtype=np.float64):
+        """ Create from DataFrame with panel at levels other than -1 of row index. Rows of each panel are stored together in order of
+        first appearance of panel, keeping order of rows within panel. Position of rows in DataFrame is kept in order. Rows with missing
+        panel are dropped
+
+        :param dframe: DataFrame with date at level -1 of row index and panel at remaining levels
+        :type dframe: pandas.DataFrame
+        :param dtype: type of values, defaults to numpy.float64
+        :type dtype: numpy.dtype, optional
+        :return: panel layout
+        :rtype: mrktmix.PanelLayout
+        """
+        if dframe.index.nlevels < 2:
+            raise Exception('Panel must be present at level -2 of row index')
+        panel_index = pd.factorize(dframe.droplevel(-1).index)[0]
+        order = np.argsort(panel_index, kind="stable")
+        order = order[panel_index[order] >= 0]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(panel_index[order]))])
+        layout = cls(dframe.to_numpy(dtype=dtype)[order], offsets, dframe.index[order], dframe.columns)
+        layout.order = order
+        return(layout)
+
+    def rows(self, panel):
+        """ Rows of given panel
+
+        :param panel: name of panel
+        :type panel: Union[str, tuple]
+        :return: slice of rows of panel
+        :rtype: slice
+        """
+        i = np.flatnonzero(self.periods > 0)[self.panels.get_loc(panel)]
+        return(slice(self.offsets[i], self.offsets[i + 1]))
+
+    def dense(self, columns=None, fill_value=0):
+        """ Dense array of (periods x panels x variables) where shorter panels are padded at end
+
+        :param columns: position of columns to be selected. All columns are selected if None, defaults to None
+        :type columns: list of int, optional
+        :param fill_value: value of padding, defaults to 0
+        :type fill_value: float, optional
+        :return: dense array
+        :rtype: numpy.ndarray
+        """
+        values = self.values if columns is None else self.values[:, columns]
+        dense = np.full((self.periods.max(initial=0), len(self.periods), values.shape[1]), fill_value, dtype=values.dtype)
+        dense[self.position, self.panel_index] = values
+        return(dense)
+
+    def to_frame(self):
+        """ Convert to DataFrame with rows of each panel stored together
+
+        :return: DataFrame with panel and date in row index
+        :rtype: pandas.DataFrame
+        """
+        return(pd.DataFrame(self.values, index=self.index, columns=self.columns))
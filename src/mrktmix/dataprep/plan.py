@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+from mrktmix.dataprep import transform as dp
+from mrktmix.dataprep.matrix import TransformedMatrix
+from mrktmix.dataprep.panel import PanelLayout
+
+
+class TransformPlan:
+    """ Plan of decay, power and lag steps for all spec tuples of a job. Specs form a DAG where each unique (variable, adstock) decay
+    step feeds unique power steps, which feed lag steps of specs. Shared decay and power steps are computed once and specs of same
+    decay step are always executed in same batch
+
+    :param all_vars: list of tuple of variable, adstock, power and lag requested by job. Duplicated specs are computed once
+    :type all_vars: list of tuple
+    """
+
+    def __init__(self, all_vars):
+        self.requested = [*all_vars]
+        self.specs = [*dict.fromkeys(self.requested)]
+        spec_position = {spec: i for i, spec in enumerate(self.specs)}
+        self.spec_position = np.array([spec_position[spec] for spec in self.requested], dtype=int)
+        decay_position = {}
+        power_position = {}
+        self.lag_steps = []
+        for var in self.specs:
+            decay = decay_position.setdefault((var[0], var[1]), len(decay_position))
+            power = power_position.setdefault((decay, var[2]), len(power_position))
+            self.lag_steps.append((power, var[3]))
+        self.decay_steps = [*decay_position.keys()]
+        self.power_steps = [*power_position.keys()]
+
+    def __len__(self):
+        return(len(self.specs))
+
+    @property
+    def stats(self):
+        """ Statistics of plan. Reuse ratio is share of requested decays served by shared decay step
+
+        :return: number of requested specs, unique specs, unique decays, unique powers and reuse ratio
+        :rtype: dictionary
+        """
+        return({"requested": len(self.requested),
+                "specs": len(self.specs),
+                "decays": len(self.decay_steps),
+                "powers": len(self.power_steps),
+                "reuse_ratio": 1 - len(self.decay_steps) / len(self.requested) if len(self.requested) else 0.})
+
+    def batches(self, batch_size=None):
+        """ Split unique specs into batches of at most batch size specs without splitting specs of same decay step. Decay step with more
+        specs than batch size makes its own batch
+
+        :param batch_size: maximum number of specs in batch. All specs are in single batch if None, defaults to None
+        :type batch_size: int, optional
+        :return: list of position of unique specs in each batch
+        :rtype: list of numpy.ndarray
+        """
+        if not len(self.specs):
+            return([])
+        if (batch_size is None) or (batch_size >= len(self.specs)):
+            return([np.arange(len(self.specs))])
+        spec_decay = np.array([self.power_steps[power][0] for power, _ in self.lag_steps], dtype=int)
+        order = np.argsort(spec_decay, kind="stable")
+        groups = np.split(order, np.flatnonzero(np.diff(spec_decay[order])) + 1)
+        all_batches = [[]]
+        for group in groups:
+            if len(all_batches[-1]) and (len(all_batches[-1]) + len(group) > batch_size):
+                all_batches.append([])
+            all_batches[-1].extend(group)
+        return([np.sort(np.array(batch, dtype=int)) for batch in all_batches])
+
+    def execute(self, dframe, panel=False, batch_size=None, cache=None, dtype=np.float64, out=None):
+        """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag for all specs of plan in batches
+
+        :param dframe: DataFrame with marketing or any other activities like spend, or panel layout
+        :type dframe: pandas.DataFrame or mrktmix.PanelLayout
+        :param panel: transformation is applied at panel level if True, defaults to False
+        :type panel: bool, optional
+        :param batch_size: maximum number of specs transformed at once. All specs are transformed at once if None, defaults to None
+        :type batch_size: int, optional
+        :param cache: cache to reuse decayed and powered series across batches, defaults to None
+        :type cache: mrktmix.TransformCache, optional
+        :param dtype: floating point type used in transformation, defaults to numpy.float64
+        :type dtype: numpy.dtype, optional
+        :param out: transformed matrix (e.g. memory mapped) with column for each requested spec in which output is written. New matrix
+            is created if None, defaults to None
+        :type out: mrktmix.TransformedMatrix, optional
+        :return: Returns input after applying adstock, power and lag transformation with column for each requested spec
+        :rtype: mrktmix.TransformedMatrix
+        """
+        if out is None:
+            out = TransformedMatrix(np.empty((len(dframe), len(self.requested)), dtype=dtype), self.requested, dframe.index)
+        for batch in self.batches(batch_size):
+            all_vars = [self.specs[i] for i in batch]
+            if isinstance(dframe, PanelLayout):
+                transformed = dp.apply_apl_layout(dframe, all_vars, cache=cache, dtype=dtype)
+            elif panel:
+                transformed = dp.apply_apl_panel(dframe, all_vars, cache=cache, dtype=dtype)
+            else:
+                transformed = dp.apply_apl_frame(dframe, all_vars, cache=cache, dtype=dtype)
+            columns = np.flatnonzero(np.isin(self.spec_position, batch))
+            out.values[:, columns] = transformed.values[:, pd.Index(batch).get_indexer(self.spec_position[columns])]
+        return(out)
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+
+class RangeSummary:
+    """ Cumulative sum over sorted dates (index at level -1) for every panel and column. Total of any date range is difference of two
+    cumulative sums, so range query does not depend on number of rows and many ranges are answered in single vectorized lookup
+
+    :param data: data to be summarised with date at level -1 of row index. If panel is present, it should be at remaining levels
+    :type data: pandas.DataFrame or mrktmix.TransformedMatrix or mrktmix.PanelLayout
+    """
+
+    def __init__(self, data):
+        values = data.to_numpy() if isinstance(data, pd.DataFrame) else data.values
+        date_index, self.dates = pd.factorize(data.index.get_level_values(-1), sort=True)
+        if data.index.nlevels - 1:
+            panel_index, panels = pd.factorize(data.index.droplevel(-1))
+            self.panels = pd.Index(panels).set_names(data.index.names[:-1])
+        else:
+            panel_index, self.panels = np.zeros(len(values), dtype=int), None
+        self.columns = data.columns
+        n_panels = 1 if self.panels is None else len(self.panels)
+        n_dates = len(self.dates)
+        # total, count and first row of every panel and date in single grouped reduction
+        selected = (panel_index >= 0) & (date_index >= 0)
+        group = panel_index[selected] * n_dates + date_index[selected]
+        group_sum = pd.DataFrame(values[selected]).groupby(group).sum()
+        date_sum = np.zeros((n_panels * n_dates, values.shape[1]), dtype=group_sum.to_numpy().dtype)
+        date_sum[group_sum.index] = group_sum.to_numpy()
+        date_count = np.bincount(group, minlength=n_panels * n_dates)
+        self.first_row = np.full(n_panels * n_dates, len(values))
+        np.minimum.at(self.first_row, group, np.flatnonzero(selected))
+        self.first_row = self.first_row.reshape(n_panels, n_dates)
+        # cumulative sum over dates of every panel with leading zero
+        self.cumsum = np.zeros((n_panels, n_dates + 1, values.shape[1]), dtype=date_sum.dtype)
+        np.cumsum(date_sum.reshape(n_panels, n_dates, values.shape[1]), axis=1, out=self.cumsum[:, 1:])
+        self.cumcount = np.zeros((n_panels, n_dates + 1), dtype=int)
+        np.cumsum(date_count.reshape(n_panels, n_dates), axis=1, out=self.cumcount[:, 1:])
+
+    def bounds(self, start, end):
+        """ Position of date ranges in cumulative sum
+
+        :param start: first date of each range. Date is inclusive
+        :type start: list
+        :param end: last date of each range. Date is inclusive
+        :type end: list
+        :return: position of start and position after end of each range
+        :rtype: tuple of numpy.ndarray
+        """
+        low_lim = np.atleast_1d(self.dates.searchsorted(start, side="left"))
+        upp_lim = np.maximum(np.atleast_1d(self.dates.searchsorted(end, side="right")), low_lim)
+        return(low_lim, upp_lim)
+
+    def query(self, start, end):
+        """ Total of every panel and column for each date range
+
+        :param start: first date of each range. Date is inclusive
+        :type start: list
+        :param end: last date of each range. Date is inclusive
+        :type end: list
+        :return: array of totals with range on axis 0, panel on axis 1 and column on axis 2
+        :rtype: numpy.ndarray
+        """
+        low_lim, upp_lim = self.bounds(start, end)
+        return((self.cumsum[:, upp_lim] - self.cumsum[:, low_lim]).transpose(1, 0, 2))
+
+    def count(self, start, end):
+        """ Number of rows of every panel for each date range
+
+        :param start: first date of each range. Date is inclusive
+        :type start: list
+        :param end: last date of each range. Date is inclusive
+        :type end: list
+        :return: array of number of rows with range on axis 0 and panel on axis 1
+        :rtype: numpy.ndarray
+        """
+        low_lim, upp_lim = self.bounds(start, end)
+        return((self.cumcount[:, upp_lim] - self.cumcount[:, low_lim]).T)
+
+    def total(self, start, end):
+        """ Total of every panel and column for single date range
+
+        :param start: first date of range. Date is inclusive
+        :type start: Union[str, pandas.Timestamp]
+        :param end: last date of range. Date is inclusive
+        :type end: Union[str, pandas.Timestamp]
+        :return: total of every column if panel is not present, else total of every panel and column
+        :rtype: pandas.Series or pandas.DataFrame
+        """
+        totals = self.query([start], [end])[0]
+        if self.panels is None:
+            return(pd.Series(totals[0], index=self.columns))
+        return(pd.DataFrame(totals, index=self.panels, columns=self.columns))
+
+    def collapse(self, date_dict):
+        """ Summarise after collapsing date in format of mrktmix.collapse_date
+
+        :param date_dict: dictionary with name and tuples of dates. Dates are inclusive.
+        :type date_dict: dictionary
+        :return: Summarise after collpasing date
+        :rtype: pandas.DataFrame
+        """
+        start = [val[0] for val in date_dict.values()]
+        end = [val[1] for val in date_dict.values()]
+        totals = self.query(start, end)
+        if self.panels is None:
+            return(period_summary_(totals, [*date_dict.keys()], self.columns))
+        # panel without any row in period is not present in summary of period and panels are in order of first row in period
+        selected_panel = self.count(start, end) > 0
+        if not selected_panel.all():
+            totals = np.where(selected_panel[:, :, np.newaxis], totals, np.nan)
+        panel_order = np.array([np.argsort(self.first_row[:, low:upp].min(axis=1, initial=np.iinfo(int).max), kind="stable")
+                                for low, upp in zip(*self.bounds(start, end))], dtype=int).reshape(len(date_dict), len(self.panels))
+        return(period_summary_(totals, [*date_dict.keys()], self.columns, self.panels, panel_order))
+
+
+def period_summary_(totals, keys, columns, panels=None, panel_order=None):
+    """ Summary of totals of every period in format of collapse_date
+
+    :param totals: array of totals with period on axis 0, panel on axis 1 and column on axis 2. Total of panel without any row in period
+        should be NaN
+    :type totals: numpy.ndarray
+    :param keys: name of each period
+    :type keys: list
+    :param columns: column index of totals
+    :type columns: pandas.MultiIndex
+    :param panels: name of each panel. Panel is not present if None, defaults to None
+    :type panels: pandas.Index, optional
+    :param panel_order: order of panels in summary of every period. Panels are in given order if None, defaults to None
+    :type panel_order: numpy.ndarray, optional
+    :return: Summarise after collpasing date
+    :rtype: pandas.DataFrame
+    """
+    all_decomp_smry = []
+    for i, (key, total) in enumerate(zip(keys, totals)):
+        if panels is None:
+            all_decomp_smry.append(pd.Series(total[0], index=columns, name=key))
+        else:
+            order = np.arange(len(panels)) if panel_order is None else panel_order[i]
+            all_decomp_smry.append(pd.DataFrame(total[order], index=panels[order], columns=columns)
+                                   .stack(list(range(0, columns.nlevels)))
+                                   .rename(key))
+    if len(all_decomp_smry):
+        return(pd.concat(all_decomp_smry, axis=1))
+    return(pd.DataFrame())
@@ -1,45 +1,679 @@
 import datetime
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
 
 import numpy as np
 import pandas as pd
-from scipy.ndimage.interpolation import shift
+from scipy.signal import fftconvolve
 from scipy.signal import lfilter
 
+from mrktmix.dataprep.matrix import TransformedMatrix
+from mrktmix.dataprep.matrix import field_array_
+from mrktmix.dataprep.panel import PanelLayout
 
-def apply_apl_(input_list, adstock, power, lag):
+KERNEL_TOLERANCE = 1e-10
+
+
+def lag_(input_array, lag, periods=None):
+    """ Lag array on axis 0 and fill vacated periods with 0. Integer lag is plain slice of array; fractional lag is linear interpolation
+    of two neighbouring integer lags. Periods which can not be interpolated from two periods of input are filled with 0. Negative lag
+    leads the array
+
+    :param input_array: array with time on axis 0
+    :type input_array: numpy.ndarray
+    :param lag: Lag transformation on activity. If list is supplied, it represents lag for each column on last axis of input array
+    :type lag: float or list of float
+    :param periods: number of periods present for each index on axis 1 when series of unequal length are padded at end on axis 0,
+        defaults to None
+    :type periods: list of int, optional
+    :return: array after applying lag transformation. Floating point type of input array is kept
+    :rtype: numpy.ndarray
+    """
+    input_array = np.asarray(input_array)
+    input_array = input_array.astype(np.promote_types(input_array.dtype, np.float32), copy=False)
+    if np.ndim(lag):
+        lag = np.asarray(lag, dtype=float)
+        lagged = np.empty_like(input_array)
+        for lag_value in np.unique(lag):
+            lagged[..., lag == lag_value] = lag_(input_array[..., lag == lag_value], lag_value, periods=periods)
+        return(lagged)
+
+    length = input_array.shape[0]
+    whole = int(np.floor(lag))
+    fraction = float(lag) - whole
+    lagged = np.zeros_like(input_array)
+    # lead of padded series must not pull values from padding
+    if (periods is not None) and (whole < 0):
+        in_period = np.arange(length)[:, np.newaxis] < np.asarray(periods)
+        input_array = np.where(in_period.reshape(in_period.shape + (1,) * (input_array.ndim - 2)), input_array, 0)
+    if not fraction:
+        if 0 <= whole < length:
+            lagged[whole:] = input_array[:length - whole]
+        elif -length < whole < 0:
+            lagged[:length + whole] = input_array[-whole:]
+    else:
+        # period t is interpolated from period t - whole - 1 and t - whole
+        start = max(whole + 1, 0)
+        end = min(whole + length, length)
+        if start < end:
+            lagged[start:end] = (fraction * input_array[start - whole - 1:end - whole - 1]
+                                 + (1 - fraction) * input_array[start - whole:end - whole])
+        # last period of fractional lead is not interpolated from padding
+        if (periods is not None) and (whole < 0):
+            last_period = np.asarray(periods) + whole
+            padded = np.flatnonzero((last_period >= 0) & (last_period < lagged.shape[0]))
+            lagged[last_period[padded], padded] = 0
+    return(lagged)
+
+
+def power_(input_array, power, column_index=None):
+    """ Apply diminishing return (power transformation) on columns of array. Logarithm is computed once for each column and all
+    powers of column are computed by single broadcasted exp(power * log(column)). Zero, negative and missing values are handled same as
+    numpy.nan_to_num(numpy.power(column, power))
+
+    :param input_array: array with columns on last axis
+    :type input_array: numpy.ndarray
+    :param power: Diminishing return or power transformation for each output column
+    :type power: list of float
+    :param column_index: position of column (on last axis of input array) for each output column. If None, each column of input array
+        has its own power, defaults to None
+    :type column_index: list of int, optional
+    :return: array with power applied columns on last axis. Floating point type of input array is kept
+    :rtype: numpy.ndarray
+    """
+    input_array = np.asarray(input_array)
+    input_array = input_array.astype(np.promote_types(input_array.dtype, np.float32), copy=False)
+    power = np.asarray(power, dtype=input_array.dtype)
+    column_index = np.arange(input_array.shape[-1]) if column_index is None else np.asarray(column_index, dtype=int)
+    positive = (input_array > 0) & (input_array < np.inf)
+    log_input = np.log(np.where(positive, input_array, 1))
+    powered = np.multiply(log_input[..., column_index], power)
+    np.exp(powered, out=powered)
+    # overflow is replaced by largest float as in numpy.nan_to_num
+    np.minimum(powered, np.finfo(powered.dtype).max, out=powered)
+    # values outside domain of logarithm
+    outside = ~positive[..., column_index]
+    if outside.any():
+        powered[outside] = np.nan_to_num(np.power(input_array[..., column_index][outside],
+                                                  np.broadcast_to(power, outside.shape)[outside]))
+    # identity and constant power are exact
+    powered[..., power == 1] = np.nan_to_num(input_array[..., column_index[power == 1]])
+    powered[..., power == 0] = 1
+    return(powered)
+
+
+def adstock_kernel_(adstock, length, dtype=np.float64):
+    """ Weights of adstock kernel on current and previous periods. Weight of lag k is decay^k for ("geometric", decay),
+    decay^((k - peak)^2) for ("delayed", decay, peak) and exp(-(k / scale)^shape) for ("weibull", shape, scale). Kernel is truncated
+    after last weight above KERNEL_TOLERANCE times maximum weight
+
+    :param adstock: tuple of kernel name and parameters
+    :type adstock: tuple
+    :param length: maximum length of kernel i.e. number of periods
+    :type length: int
+    :param dtype: floating point type of weights, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :return: weights of kernel starting at current period
+    :rtype: numpy.ndarray
+    """
+    lags = np.arange(max(length, 1), dtype=float)
+    if adstock[0] == "geometric":
+        weight = np.power(float(adstock[1]), lags)
+    elif adstock[0] == "delayed":
+        weight = np.power(float(adstock[1]), np.square(lags - adstock[2]))
+    elif adstock[0] == "weibull":
+        weight = np.exp(-np.power(lags / adstock[2], adstock[1]))
+    else:
+        raise Exception('Adstock kernel should be one of geometric, delayed or weibull')
+    significant = np.flatnonzero(np.abs(weight) > KERNEL_TOLERANCE * np.abs(weight).max())
+    return(weight[:significant[-1] + 1 if len(significant) else 1].astype(dtype))
+
+
+def convolve_(input_matrix, adstock, dtype=np.float64):
+    """ Apply adstock kernels on columns of matrix in single FFT based batch convolution. Missing value is carried to periods covered
+    by kernel
+
+    :param input_matrix: array with time on axis 0 and columns on last axis
+    :type input_matrix: numpy.ndarray
+    :param adstock: tuple of kernel name and parameters (see adstock_kernel_) for each column
+    :type adstock: list of tuple
+    :param dtype: floating point type used in convolution, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :return: array after applying adstock kernel on each column
+    :rtype: numpy.ndarray
+    """
+    input_matrix = np.asarray(input_matrix, dtype=dtype)
+    length = input_matrix.shape[0]
+    if length == 0:
+        return(input_matrix.copy())
+    # weights computed once for each unique kernel
+    kernel_index, adstock = pd.factorize(field_array_([*adstock]))
+    kernels = [adstock_kernel_(i, length, dtype=dtype) for i in adstock]
+    weight = np.zeros((max(len(i) for i in kernels), len(kernels)), dtype=dtype)
+    for i, kernel in enumerate(kernels):
+        weight[:len(kernel), i] = kernel
+    weight = weight[:, kernel_index].reshape((len(weight),) + (1,) * (input_matrix.ndim - 2) + (len(kernel_index),))
+    missing = np.isnan(input_matrix)
+    if missing.any():
+        input_matrix = np.where(missing, 0, input_matrix)
+    convolved = fftconvolve(input_matrix, weight, axes=0)[:length].astype(dtype, copy=False)
+    if missing.any():
+        convolved[fftconvolve(missing.astype(dtype), (weight != 0).astype(dtype), axes=0)[:length] > .5] = np.nan
+    return(convolved)
+
+
+def recursive_filter_(input_matrix, coefficient):
+    """ First order recursive filter with coefficient varying over time, i.e. output[t] = input[t] + coefficient[t] * output[t - 1].
+    Filter is applied on all columns at once in single pass over axis 0
+
+    :param input_matrix: array with time on axis 0
+    :type input_matrix: numpy.ndarray
+    :param coefficient: coefficient for each element of input matrix
+    :type coefficient: numpy.ndarray
+    :return: filtered array
+    :rtype: numpy.ndarray
+    """
+    output = np.empty_like(input_matrix)
+    previous = np.zeros(input_matrix.shape[1:], dtype=input_matrix.dtype)
+    for i in range(len(input_matrix)):
+        previous = output[i] = input_matrix[i] + coefficient[i] * previous
+    return(output)
+
+
+def decay_(input_matrix, adstock, gap=None, dtype=np.float64):
+    """ Geometric decay (carry over effect) on columns of array along axis 0. Columns with missing value are decayed by time varying
+    recursive filter if gap is given. Decayed value of missing period is carry over kept for next period
+
+    :param input_matrix: array with time on axis 0
+    :type input_matrix: numpy.ndarray
+    :param adstock: Adstock, carry over effect or decay effect
+    :type adstock: float
+    :param gap: treatment of missing periods in decay. If "reset", carry over restarts after missing periods. If "hold", carry over is
+        held over missing periods. If None, missing value is carried in decay, defaults to None
+    :type gap: str, optional
+    :param dtype: floating point type used in decay, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :return: decayed array
+    :rtype: numpy.ndarray
+    """
+    if gap not in [None, "reset", "hold"]:
+        raise Exception('Gap should be one of None, reset or hold')
+    has_gap = np.zeros(input_matrix.shape[-1], dtype=bool)
+    if gap is not None:
+        missing = np.isnan(input_matrix)
+        has_gap = missing.any(axis=tuple(range(input_matrix.ndim - 1)))
+    if not has_gap.any():
+        return(lfilter(np.ones(1, dtype=dtype), np.array([1, -adstock], dtype=dtype), input_matrix, axis=0))
+    decayed = np.empty(input_matrix.shape, dtype=dtype)
+    if not has_gap.all():
+        decayed[..., ~has_gap] = lfilter(np.ones(1, dtype=dtype), np.array([1, -adstock], dtype=dtype), input_matrix[..., ~has_gap],
+                                         axis=0)
+    missing = missing[..., has_gap]
+    decayed[..., has_gap] = recursive_filter_(np.where(missing, 0, input_matrix[..., has_gap]),
+                                              np.where(missing, {"reset": 0, "hold": 1}[gap], adstock).astype(dtype))
+    return(decayed)
+
+
+def apply_apl_(input_list, adstock, power, lag, cache=None, dtype=np.float64, gradient=False, gap=None):
     """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag on array
 
     :param input_list: list of float with marketing or any other activities like spend
     :type input_list: list
-    :param adstock: Adstock, carry over effect or decay effect on activity
-    :type adstock: float
+    :param adstock: Adstock, carry over effect or decay effect on activity. Tuple of kernel name and parameters (see adstock_kernel_)
+        applies convolution adstock
+    :type adstock: float or tuple
     :param power: Diminishing return or power transformation on activity
     :type power: float
     :param lag: Lag transformation on activity
     :type lag: float
-    :return: list after applying adstock, power and lag transformation
-    :rtype: list
+    :param cache: cache to reuse decayed and powered series across calls, defaults to None
+    :type cache: mrktmix.dataprep.cache.TransformCache, optional
+    :param dtype: floating point type used in transformation, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :param gradient: Returns derivative of output with respect to adstock and power along with output, defaults to False
+    :type gradient: bool, optional
+    :param gap: treatment of missing periods in decay. If "reset", carry over restarts after missing periods. If "hold", carry over is
+        held over missing periods. If None, missing value is carried in decay, defaults to None
+    :type gap: str, optional
+    :return: list after applying adstock, power and lag transformation. If gradient is True, tuple of output, derivative with respect
+        to adstock and derivative with respect to power
+    :rtype: list or tuple
     """
+    if (cache is not None) or gradient or (gap is not None):
+        transformed = apply_apl_matrix(np.asarray(input_list)[:, np.newaxis], [0], [adstock], [power], [lag], cache=cache, dtype=dtype,
+                                       gradient=gradient, gap=gap)
+        return(tuple(i[:, 0] for i in transformed) if gradient else transformed[:, 0])
 
-    return(shift(np.nan_to_num(np.power(lfilter([1], [1, -float(adstock)], input_list, axis=0), power)), lag, cval=0, order=1))
+    if isinstance(adstock, tuple):
+        decayed = convolve_(np.asarray(input_list, dtype=dtype)[:, np.newaxis], [adstock], dtype=dtype)[:, 0]
+    else:
+        decayed = lfilter(np.ones(1, dtype=dtype), np.array([1, -float(adstock)], dtype=dtype), np.asarray(input_list, dtype=dtype),
+                          axis=0)
+    return(lag_(np.nan_to_num(np.power(decayed, np.asarray(power, dtype=dtype))), lag))
 
 
-def apply_apl_series(df_series, adstock, power, lag):
+def apply_apl_series(df_series, adstock, power, lag, cache=None):
     """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag on pandas.Series
 
     :param df_series: Series with marketing or any other activities like spend
     :type df_series: pandas.Series
-    :param adstock: Adstock, carry over effect or decay effect on activity
-    :type adstock: float
+    :param adstock: Adstock, carry over effect or decay effect on activity. Tuple of kernel name and parameters (see adstock_kernel_)
+        applies convolution adstock
+    :type adstock: float or tuple
     :param power: Diminishing return or power transformation on activity
     :type power: float
     :param lag: Lag transformation on activity
     :type lag: float
+    :param cache: cache to reuse decayed and powered series across calls, defaults to None
+    :type cache: mrktmix.dataprep.cache.TransformCache, optional
     :return: Returns input after applying adstock, power and lag transformation
     :rtype: pandas.Series
     """
     if isinstance(df_series, pd.Series):
-        return(pd.Series(apply_apl_(df_series, adstock, power, lag), index=df_series.index, name=(df_series.name, adstock, power, lag)))
+        return(pd.Series(apply_apl_(df_series, adstock, power, lag, cache=cache), index=df_series.index,
+                         name=(df_series.name, adstock, power, lag)))
+
+
+def apply_apl_matrix(input_matrix, spec_index, adstock, power, lag, cache=None, periods=None, dtype=np.float64, gradient=False,
+                     gap=None):
+    """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag on every spec of a spec table in
+    single pass. Decay is computed once for each unique (variable, adstock) and power once for each unique (variable, adstock, power);
+    lag is broadcasted on the powered block. Geometric decay is applied by recursive filter and adstock kernels in single batch
+    convolution
+
+    :param input_matrix: array with time on axis 0 and variables on last axis. Any axis in between (e.g. panel) is kept as it is
+    :type input_matrix: numpy.ndarray
+    :param spec_index: position of variable (on last axis of input matrix) for each spec
+    :type spec_index: list of int
+    :param adstock: Adstock, carry over effect or decay effect for each spec. Tuple of kernel name and parameters (see adstock_kernel_)
+        applies convolution adstock
+    :type adstock: list of float or tuple
+    :param power: Diminishing return or power transformation for each spec
+    :type power: list of float
+    :param lag: Lag transformation for each spec
+    :type lag: list of float
+    :param cache: cache to reuse decayed and powered series across calls, defaults to None
+    :type cache: mrktmix.dataprep.cache.TransformCache, optional
+    :param periods: number of periods present for each index on axis 1 when panels of unequal length are padded at end on axis 0,
+        defaults to None
+    :type periods: list of int, optional
+    :param dtype: floating point type used in transformation, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :param gradient: Returns derivative of output with respect to adstock and power along with output. Derivative with respect to
+        adstock is computed by recursive filter on previous decayed value and is not available for adstock kernel, defaults to False
+    :type gradient: bool, optional
+    :param gap: treatment of missing periods in decay. If "reset", carry over restarts after missing periods. If "hold", carry over is
+        held over missing periods. If None, missing value is carried in decay, output of
+        missing period is 0. Gap is not available for adstock kernel, defaults to None
+    :type gap: str, optional
+    :return: array with time on axis 0 and specs on last axis after applying adstock, power and lag transformation. If gradient is
+        True, tuple of output, derivative with respect to adstock and derivative with respect to power
+    :rtype: numpy.ndarray or tuple
+    """
+    input_matrix = np.asarray(input_matrix, dtype=dtype)
+    spec_index = np.asarray(spec_index, dtype=int)
+    adstock_index, adstock = pd.factorize(field_array_([tuple(i) if isinstance(i, (tuple, list)) else float(i) for i in adstock]))
+    power = np.asarray(power, dtype=float)
+    lag = np.asarray(lag, dtype=float)
+    if cache is not None:
+        column_keys = {i: cache.column_key(input_matrix[..., i]) for i in np.unique(spec_index)}
+
+    # unique decay (variable, adstock) and unique power (decay, power) shared by specs
+    decay_spec, decay_index = np.unique(np.stack([spec_index, adstock_index]), axis=1, return_inverse=True)
+    power_spec, power_index = np.unique(np.stack([decay_index.reshape(-1), power]), axis=1, return_inverse=True)
+    decay_keys = [("decay", column_keys[i], adstock[j]) + ((gap,) if gap else ()) for i, j in decay_spec.T] if cache is not None else []
+    power_keys = [decay_keys[int(i)] + (j,) for i, j in power_spec.T] if cache is not None else []
+
+    # cached powered series
+    powered = np.empty(input_matrix.shape[:-1] + (power_spec.shape[1],), dtype=dtype)
+    power_missing = np.ones(power_spec.shape[1], dtype=bool)
+    for i, key in enumerate(power_keys):
+        cached = cache.get(key)
+        if cached is not None:
+            powered[..., i] = cached
+            power_missing[i] = False
+
+    # decay once for each unique variable and adstock required by missing powered series
+    decayed = np.empty(input_matrix.shape[:-1] + (decay_spec.shape[1],), dtype=dtype)
+    decay_missing = np.isin(np.arange(decay_spec.shape[1]), power_spec[0, power_missing]) | gradient
+    for i in np.flatnonzero(decay_missing) if cache is not None else []:
+        cached = cache.get(decay_keys[i])
+        if cached is not None:
+            decayed[..., i] = cached
+            decay_missing[i] = False
+    kernel = np.array([isinstance(i, tuple) for i in adstock], dtype=bool)[decay_spec[1]]
+    if gradient and kernel.any():
+        raise Exception('Derivative with respect to adstock is not available for adstock kernel')
+    if (gap is not None) and kernel.any():
+        raise Exception('Gap is not available for adstock kernel')
+    for i in np.unique(decay_spec[1, decay_missing & ~kernel]):
+        selected = decay_missing & (decay_spec[1] == i)
+        decayed[..., selected] = decay_(input_matrix[..., decay_spec[0, selected]], adstock[i], gap=gap, dtype=dtype)
+    selected = decay_missing & kernel
+    if selected.any():
+        decayed[..., selected] = convolve_(input_matrix[..., decay_spec[0, selected]], adstock[decay_spec[1, selected]], dtype=dtype)
+    if cache is not None:
+        _ = [cache.put(decay_keys[i], decayed[..., i]) for i in np.flatnonzero(decay_missing)]
+
+    # power once for each unique decayed series and power. Missing period is masked after decay
+    if gap is not None:
+        gap_mask = np.isnan(input_matrix[..., decay_spec[0]])
+        masked = np.where(gap_mask, np.nan, decayed)
+    else:
+        masked = decayed
+    powered[..., power_missing] = power_(masked, power_spec[1, power_missing], power_spec[0, power_missing].astype(int))
+    if cache is not None:
+        _ = [cache.put(power_keys[i], powered[..., i]) for i in np.flatnonzero(power_missing)]
+
+    # lag broadcasted on powered block
+    if not gradient:
+        return(lag_(powered[..., power_index.reshape(-1)], lag, periods=periods))
+
+    # derivative of decay with respect to adstock follows recursion g[t] = decayed[t - 1] + adstock * g[t - 1]
+    decay_gradient = np.empty_like(decayed)
+    for i in np.unique(decay_spec[1]):
+        selected = decay_spec[1] == i
+        if gap is None:
+            decay_gradient[..., selected] = lfilter(np.array([0, 1], dtype=dtype), np.array([1, -adstock[i]], dtype=dtype),
+                                                    decayed[..., selected], axis=0)
+        else:
+            previous = np.concatenate([np.zeros_like(decayed[:1, ..., selected]), decayed[:-1, ..., selected]])
+            decay_gradient[..., selected] = recursive_filter_(np.where(gap_mask[..., selected], 0, previous),
+                                                              np.where(gap_mask[..., selected], {"reset": 0, "hold": 1}[gap],
+                                                                       adstock[i]).astype(dtype))
+    # chain rule through power and lag
+    decay_position = power_spec[0].astype(int)
+    exponent = power_spec[1].astype(dtype)
+    adstock_gradient = exponent * power_(masked, exponent - 1, decay_position) * decay_gradient[..., decay_position]
+    positive = masked[..., decay_position] > 0
+    power_gradient = np.where(positive, powered * np.log(np.where(positive, masked[..., decay_position], 1)), 0).astype(dtype)
+    return(tuple(lag_(i[..., power_index.reshape(-1)], lag, periods=periods) for i in [powered, adstock_gradient, power_gradient]))
+
+
+def apply_apl_step(input_matrix, spec_index, adstock, power, lag, state, periods=None):
+    """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag on new periods of data, continuing
+    from state left by previous periods. Output is same as transformation of all periods at once, but only new periods are computed.
+    Lead (negative lag) and adstock kernel can not be applied on new periods
+
+    :param input_matrix: array of new periods with time on axis 0, panel on axis 1 and variables on last axis
+    :type input_matrix: numpy.ndarray
+    :param spec_index: position of variable (on last axis of input matrix) for each spec
+    :type spec_index: list of int
+    :param adstock: Adstock, carry over effect or decay effect for each spec
+    :type adstock: list of float
+    :param power: Diminishing return or power transformation for each spec
+    :type power: list of float
+    :param lag: Lag transformation for each spec
+    :type lag: list of float
+    :param state: state after previous periods with last decayed value ("decayed", panel x spec), last powered values ("powered",
+        periods x panel x spec) and number of periods seen ("seen", panel). If None, transformation starts from first period
+    :type state: dictionary or None
+    :param periods: number of new periods present for each panel when panels of unequal length are padded at end on axis 0,
+        defaults to None
+    :type periods: list of int, optional
+    :return: array of new periods with time on axis 0, panel on axis 1 and specs on last axis, and state after new periods
+    :rtype: tuple of numpy.ndarray and dictionary
+    """
+    if any(isinstance(i, (tuple, list)) for i in adstock):
+        raise Exception('Adstock kernel can not be applied on new periods')
+    input_matrix = np.asarray(input_matrix, dtype=float)
+    spec_index = np.asarray(spec_index, dtype=int)
+    adstock = np.asarray(adstock, dtype=float)
+    power = np.asarray(power, dtype=float)
+    lag = np.asarray(lag, dtype=float)
+    if (lag < 0).any():
+        raise Exception('Lead (negative lag) can not be applied on new periods')
+    new_periods, panels = input_matrix.shape[0], input_matrix.shape[1]
+    periods = np.full(panels, new_periods) if periods is None else np.asarray(periods)
+    buffer_length = int(np.floor(lag.max(initial=0))) + 1
+    if state is None:
+        state = {"decayed": np.zeros((panels, len(spec_index))),
+                 "powered": np.zeros((buffer_length, panels, len(spec_index))),
+                 "seen": np.zeros(panels, dtype=int)}
+
+    # decay continues from last decayed value
+    decayed = np.empty(input_matrix.shape[:-1] + (len(spec_index),))
+    for decay in np.unique(adstock):
+        selected = adstock == decay
+        decayed[..., selected] = lfilter([1], [1, -decay], input_matrix[..., spec_index[selected]], axis=0,
+                                         zi=decay * state["decayed"][np.newaxis, :, selected])[0]
+    powered = np.concatenate([state["powered"], power_(decayed, power)])
+
+    # lag on last powered values followed by new periods
+    transformed = lag_(powered, lag)[buffer_length:]
+    whole = np.floor(lag)
+    not_started = ((state["seen"][:, np.newaxis] + np.arange(new_periods)[:, np.newaxis, np.newaxis] - whole - 1 < 0)
+                   & (lag != whole))
+    transformed[not_started] = 0
+
+    # state at last period of each panel
+    last_period = np.minimum(periods, new_periods)
+    state = {"decayed": np.where(last_period[:, np.newaxis] > 0,
+                                 decayed[np.maximum(last_period - 1, 0), np.arange(panels)],
+                                 state["decayed"]),
+             "powered": np.take_along_axis(powered, (np.arange(buffer_length)[:, np.newaxis] + last_period)[..., np.newaxis],
+                                           axis=0),
+             "seen": state["seen"] + last_period}
+    return(transformed, state)
+
+
+def apply_apl_frame(dframe, all_vars, cache=None, dtype=np.float64, n_jobs=1, gap=None):
+    """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag on pandas.DataFrame for list of
+    spec tuples in single pass
+
+    :param dframe: DataFrame with marketing or any other activities like spend
+    :type dframe: pandas.DataFrame
+    :param all_vars: list of tuple of variable, adstock, power and lag
+    :type all_vars: list of tuple
+    :param cache: cache to reuse decayed and powered series across calls, defaults to None
+    :type cache: mrktmix.dataprep.cache.TransformCache, optional
+    :param dtype: floating point type used in transformation, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :param n_jobs: number of worker processes sharing transformation of specs. Cache is not used by worker processes, defaults to 1
+    :type n_jobs: int, optional
+    :param gap: treatment of missing periods in decay. If "reset", carry over restarts after missing periods. If "hold", carry over is
+        held over missing periods. If None, missing value is carried in decay, defaults to None
+    :type gap: str, optional
+    :return: Returns input after applying adstock, power and lag transformation with column for each spec tuple
+    :rtype: mrktmix.TransformedMatrix
+    """
+    spec_index, variables = pd.factorize(pd.Series([var[0] for var in all_vars], dtype=object))
+    spec = (spec_index, [var[1] for var in all_vars], [var[2] for var in all_vars], [var[3] for var in all_vars])
+    if n_jobs > 1:
+        transformed = apply_apl_parallel(dframe[[*variables]].to_numpy(dtype=dtype),
+                                         [dict(task, gap=gap) for task in spec_tasks_(*spec, n_jobs)],
+                                         (len(dframe), len(all_vars)),
+                                         n_jobs)
+    else:
+        transformed = apply_apl_matrix(dframe[[*variables]].to_numpy(dtype=dtype), *spec, cache=cache, dtype=dtype, gap=gap)
+    return(TransformedMatrix(transformed, all_vars, dframe.index))
+
+
+def panel_position_(panel_index):
+    """ Position of each row within its panel, keeping order of rows within panel
+
+    :param panel_index: integer code of panel for each row
+    :type panel_index: numpy.ndarray
+    :return: position of each row within its panel and number of rows in each panel
+    :rtype: tuple of numpy.ndarray
+    """
+    order = np.argsort(panel_index, kind="stable")
+    periods = np.bincount(panel_index)
+    position = np.empty(len(order), dtype=int)
+    position[order] = np.arange(len(order)) - np.repeat(np.cumsum(periods) - periods, periods)
+    return(position, periods)
+
+
+def apply_apl_panel(dframe, all_vars, cache=None, dtype=np.float64, n_jobs=1, gap=None):
+    """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag on each panel of pandas.DataFrame for
+    list of spec tuples in single pass. Panels are laid out as dense array of (dates x panels x variables), shorter panels are padded
+    at end, and transformation is applied along date axis for all panels at once
+
+    :param dframe: DataFrame with marketing or any other activities like spend. Date must be at level -1 of row index and panel at
+        remaining levels
+    :type dframe: pandas.DataFrame
+    :param all_vars: list of tuple of variable, adstock, power and lag
+    :type all_vars: list of tuple
+    :param cache: cache to reuse decayed and powered series across calls, defaults to None
+    :type cache: mrktmix.dataprep.cache.TransformCache, optional
+    :param dtype: floating point type used in transformation, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :param n_jobs: number of worker processes sharing transformation of specs. Cache is not used by worker processes, defaults to 1
+    :type n_jobs: int, optional
+    :param gap: treatment of missing periods in decay. If "reset", carry over restarts after missing periods. If "hold", carry over is
+        held over missing periods. If None, missing value is carried in decay, defaults to None
+    :type gap: str, optional
+    :return: Returns input after applying adstock, power and lag transformation with column for each spec tuple
+    :rtype: mrktmix.TransformedMatrix
+    """
+    layout = PanelLayout.from_frame(dframe[[*dict.fromkeys(var[0] for var in all_vars)]], dtype=dtype)
+    transformed = apply_apl_layout(layout, all_vars, cache=cache, dtype=dtype, n_jobs=n_jobs, gap=gap)
+    df_transformed = np.full((len(dframe), len(all_vars)), np.nan, dtype=dtype)
+    df_transformed[layout.order] = transformed.values
+    return(TransformedMatrix(df_transformed, all_vars, dframe.index))
+
+
+def apply_apl_layout(layout, all_vars, cache=None, dtype=np.float64, n_jobs=1, gap=None):
+    """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag on each panel of panel layout for
+    list of spec tuples in single pass. Panels are laid out as dense array of (dates x panels x variables) from offsets, shorter panels
+    are padded at end, and transformation is applied along date axis for all panels at once
+
+    :param layout: panel data with rows of each panel stored together
+    :type layout: mrktmix.PanelLayout
+    :param all_vars: list of tuple of variable, adstock, power and lag
+    :type all_vars: list of tuple
+    :param cache: cache to reuse decayed and powered series across calls, defaults to None
+    :type cache: mrktmix.dataprep.cache.TransformCache, optional
+    :param dtype: floating point type used in transformation, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :param n_jobs: number of worker processes sharing transformation of specs. Cache is not used by worker processes, defaults to 1
+    :type n_jobs: int, optional
+    :param gap: treatment of missing periods in decay. If "reset", carry over restarts after missing periods. If "hold", carry over is
+        held over missing periods. If None, missing value is carried in decay, defaults to None
+    :type gap: str, optional
+    :return: Returns input after applying adstock, power and lag transformation with column for each spec tuple and row of layout
+    :rtype: mrktmix.TransformedMatrix
+    """
+    spec_index, variables = pd.factorize(pd.Series([var[0] for var in all_vars], dtype=object))
+    columns = pd.Index(layout.columns).get_indexer(variables)
+    if (columns < 0).any():
+        raise Exception('Variables are not present in panel layout')
+    dense = layout.dense(columns).astype(dtype, copy=False)
+    periods = layout.periods
+    spec = (spec_index, [var[1] for var in all_vars], [var[2] for var in all_vars], [var[3] for var in all_vars])
+    if n_jobs > 1:
+        transformed = apply_apl_parallel(dense,
+                                         [dict(task, periods=periods, gap=gap) for task in spec_tasks_(*spec, n_jobs)],
+                                         dense.shape[:-1] + (len(all_vars),),
+                                         n_jobs)
+    else:
+        transformed = apply_apl_matrix(dense, *spec, cache=cache, periods=periods, dtype=dtype, gap=gap)
+    return(TransformedMatrix(transformed[layout.position, layout.panel_index], all_vars, layout.index))
+
+
+def spec_tasks_(spec_index, adstock, power, lag, n_tasks):
+    """ Split specs into tasks of apply_apl_parallel. Specs of same variable are kept together, so decay is shared within task
+
+    :param spec_index: position of variable for each spec
+    :type spec_index: list of int
+    :param adstock: Adstock, carry over effect or decay effect for each spec
+    :type adstock: list of float
+    :param power: Diminishing return or power transformation for each spec
+    :type power: list of float
+    :param lag: Lag transformation for each spec
+    :type lag: list of float
+    :param n_tasks: number of tasks
+    :type n_tasks: int
+    :return: list of task with spec and output column of spec
+    :rtype: list of dictionary
+    """
+    order = np.argsort(spec_index, kind="stable")
+    return([{"spec_index": np.asarray(spec_index)[columns],
+             "adstock": field_array_([*adstock])[columns],
+             "power": np.asarray(power)[columns],
+             "lag": np.asarray(lag)[columns],
+             "columns": columns} for columns in np.array_split(order, n_tasks) if len(columns)])
+
+
+def apply_apl_shared_(input_block, output_block, spec_index, adstock, power, lag, columns, rows=None, output_rows=None, periods=None,
+                      gap=None):
+    """ Worker of apply_apl_parallel. Read input matrix from shared memory, apply advertisement decay, diminishing return and lag and
+    write transformed columns into shared memory output
+
+    :param input_block: name, shape and dtype of shared memory with input matrix
+    :type input_block: tuple
+    :param output_block: name, shape and dtype of shared memory with output matrix
+    :type output_block: tuple
+    :param spec_index: position of variable (on last axis of input matrix) for each spec
+    :type spec_index: list of int
+    :param adstock: Adstock, carry over effect or decay effect for each spec
+    :type adstock: list of float
+    :param power: Diminishing return or power transformation for each spec
+    :type power: list of float
+    :param lag: Lag transformation for each spec
+    :type lag: list of float
+    :param columns: position of each spec on last axis of output matrix
+    :type columns: list of int
+    :param rows: position of rows (axis 0) of input matrix to be transformed. All rows are transformed if None, defaults to None
+    :type rows: list of int, optional
+    :param output_rows: start and end of rows (axis 0) in output matrix. All rows are written if None, defaults to None
+    :type output_rows: tuple, optional
+    :param periods: number of periods present for each index on axis 1 of padded input matrix, defaults to None
+    :type periods: list of int, optional
+    :param gap: treatment of missing periods in decay. If "reset", carry over restarts after missing periods. If "hold", carry over is
+        held over missing periods. If None, missing value is carried in decay, defaults to None
+    :type gap: str, optional
+    """
+    input_memory = SharedMemory(name=input_block[0])
+    output_memory = SharedMemory(name=output_block[0])
+    try:
+        input_matrix = np.ndarray(input_block[1], dtype=input_block[2], buffer=input_memory.buf)
+        output_matrix = np.ndarray(output_block[1], dtype=output_block[2], buffer=output_memory.buf)
+        output_matrix = output_matrix if output_rows is None else output_matrix[output_rows[0]:output_rows[1]]
+        output_matrix[..., columns] = apply_apl_matrix(input_matrix if rows is None else input_matrix[rows],
+                                                       spec_index, adstock, power, lag, periods=periods, dtype=input_block[2],
+                                                       gap=gap)
+        del input_matrix, output_matrix
+    finally:
+        input_memory.close()
+        output_memory.close()
+
+
+def apply_apl_parallel(input_matrix, tasks, output_shape, n_jobs):
+    """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag in process pool. Input matrix is
+    shared with worker processes through shared memory and workers write transformed columns into preallocated shared memory output,
+    so data is not pickled between processes. Output is initialized with missing value
+
+    :param input_matrix: array with time on axis 0 and variables on last axis
+    :type input_matrix: numpy.ndarray
+    :param tasks: list of arguments of apply_apl_shared_ other than input and output block
+    :type tasks: list of dictionary
+    :param output_shape: shape of output matrix
+    :type output_shape: tuple
+    :param n_jobs: number of worker processes
+    :type n_jobs: int
+    :return: output matrix with same floating point type as input matrix
+    :rtype: numpy.ndarray
+    """
+    input_matrix = np.ascontiguousarray(input_matrix)
+    dtype = input_matrix.dtype.str
+    output_size = int(np.prod(output_shape)) * input_matrix.itemsize
+    input_memory = SharedMemory(create=True, size=max(input_matrix.nbytes, 1))
+    output_memory = SharedMemory(create=True, size=max(output_size, 1))
+    try:
+        np.ndarray(input_matrix.shape, dtype=dtype, buffer=input_memory.buf)[...] = input_matrix
+        np.ndarray(output_shape, dtype=dtype, buffer=output_memory.buf)[...] = np.nan
+        input_block = (input_memory.name, input_matrix.shape, dtype)
+        output_block = (output_memory.name, tuple(output_shape), dtype)
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            _ = [job.result() for job in [executor.submit(apply_apl_shared_, input_block, output_block, **task) for task in tasks]]
+        output_matrix = np.ndarray(output_shape, dtype=dtype, buffer=output_memory.buf).copy()
+    finally:
+        input_memory.close()
+        input_memory.unlink()
+        output_memory.close()
+        output_memory.unlink()
+    return(output_matrix)
 
 
 def create_base_(variable, date_input, freq, increasing=False, negative=False, periods=1, panel=None):
@@ -1,9 +1,114 @@
 import numpy as np
 import pandas as pd
 from scipy.optimize import Bounds
+from scipy.optimize import OptimizeResult
 from scipy.optimize import minimize
 
 
+def kkt_allocation_(_coef, _power, lower_bound, upper_bound, log_multiplier):
+    """ Spend at which marginal revenue (coef * power * spend ^ (power - 1)) of every channel equals Lagrange multiplier, clipped to
+    bounds. Spend is decreasing in multiplier
+
+    :param _coef: coefficients
+    :type _coef: numpy.ndarray
+    :param _power: diminshing return on spend
+    :type _power: numpy.ndarray
+    :param lower_bound: lower bound for spend
+    :type lower_bound: numpy.ndarray
+    :param upper_bound: upper bound for spend
+    :type upper_bound: numpy.ndarray
+    :param log_multiplier: log of Lagrange multiplier
+    :type log_multiplier: float
+    :return: spend of every channel
+    :rtype: numpy.ndarray
+    """
+    with np.errstate(over="ignore", under="ignore"):
+        spend = np.exp((log_multiplier - np.log(_coef * _power)) / (_power - 1))
+    return(np.clip(spend, lower_bound, upper_bound))
+
+
+def kkt_optimization(_coef,
+                     _power,
+                     lower_bound,
+                     upper_bound,
+                     tot_constraint,
+                     contraint_type="budget",
+                     maxiter=200,
+                     tol=1e-8):
+    """ Optimize revenue/budget (Revenue= summation of coef * spend ^ power) for positive coef and 0 < power < 1, where revenue is
+    concave. At optimum, marginal revenue of every channel within bounds equals single Lagrange multiplier, so spend of every channel is
+    function of multiplier and multiplier is found by bisection on total spend (budget) or total revenue (revenue). Each iteration is
+    O(number of channels). Lower bound below 0 is taken as 0
+
+    :param _coef: list of float representing coefficients
+    :type _coef: list of float
+    :param _power: list of float representing diminshing return on spend
+    :type _power: list of float
+    :param lower_bound: list of number representing lower bound for spend
+    :type lower_bound: list of number
+    :param upper_bound: list of number representing upper bound for spend
+    :type upper_bound: list of number
+    :param tot_constraint: total contraint either total spend or total revenue
+    :type tot_constraint: numeric
+    :param contraint_type: defines type for tot_constraint. Default value is 'budget'
+    :type contraint_type: string, optional
+    :param maxiter: maximum number of bisection iteration
+    :type maxiter: integer, optional
+    :param tol: relative tolerance of total constraint
+    :type tol: float, optional
+    :return: Optimized result. Optimization is not successful if total constraint is not attainable within bounds
+    :rtype: scipy.optimize.optimize.OptimizeResult
+    """
+    _coef = np.asarray(_coef, dtype=float)
+    _power = np.asarray(_power, dtype=float)
+    lower_bound = np.maximum(np.asarray(lower_bound, dtype=float), 0)
+    upper_bound = np.asarray(upper_bound, dtype=float)
+
+    if contraint_type == "revenue":
+        def total(x):
+            return(np.sum(_coef * (x**_power)))
+    else:
+        def total(x):
+            return(np.sum(x))
+    # total is decreasing in multiplier, from total at upper bound to total at lower bound
+    low_lim = np.log(_coef * _power).min() - 1
+    upp_lim = np.log(_coef * _power).max() + 1
+    n_iter = 0
+    message = "Optimization terminated successfully"
+    if total(upper_bound) < tot_constraint:
+        # spend is at upper bound if total constraint is not attainable
+        low_lim, upp_lim, message = -np.inf, -np.inf, "Total constraint is not attainable within bounds"
+    elif total(lower_bound) > tot_constraint:
+        low_lim, upp_lim, message = np.inf, np.inf, "Total constraint is not attainable within bounds"
+    else:
+        while total(kkt_allocation_(_coef, _power, lower_bound, upper_bound, low_lim)) < tot_constraint:
+            low_lim, n_iter = low_lim - 2**n_iter, n_iter + 1
+        while total(kkt_allocation_(_coef, _power, lower_bound, upper_bound, upp_lim)) > tot_constraint:
+            upp_lim, n_iter = upp_lim + 2**n_iter, n_iter + 1
+        while n_iter < maxiter:
+            n_iter = n_iter + 1
+            multiplier = (low_lim + upp_lim) / 2
+            constraint = total(kkt_allocation_(_coef, _power, lower_bound, upper_bound, multiplier))
+            if abs(constraint - tot_constraint) <= tol * abs(tot_constraint):
+                low_lim, upp_lim = multiplier, multiplier
+                break
+            if constraint > tot_constraint:
+                low_lim = multiplier
+            else:
+                upp_lim = multiplier
+        else:
+            message = "Maximum number of iteration is reached"
+    x = kkt_allocation_(_coef, _power, lower_bound, upper_bound, (low_lim + upp_lim) / 2)
+    success = bool(abs(total(x) - tot_constraint) <= tol * abs(tot_constraint))
+    return(OptimizeResult(x=x,
+                          fun=np.sum(x) if contraint_type == "revenue" else -np.sum(_coef * (x**_power)),
+                          success=success,
+                          status=0 if success else 1,
+                          message=message,
+                          nit=n_iter,
+                          multiplier=np.exp((low_lim + upp_lim) / 2)))
+
+
 def optimization(_coef,
                  _init,
                  _power,
@@ -11,7 +116,8 @@ def optimization(_coef,
                  upper_bound,
                  tot_constraint,
                  contraint_type="budget",
-                 maxiter=100):
+                 maxiter=100,
+                 method="SLSQP"):
     """ Optimize revenue/budget (Revenue= summation of coef * spend ^ power) based in initial value and constraint. Constraints
     is in form of lower bound, upper bound and either budget or revenue
 
@@ -31,9 +137,16 @@ def optimization(_coef,
     :type contraint_type: string, optional
     :param maxiter: maximum number of iteration
     :type maxiter: integer, optional
+    :param method: 'SLSQP' or 'kkt'. If 'kkt', optimum is found by bisection on Lagrange multiplier (kkt_optimization) when all
+        coef are positive and 0 < power < 1, else SLSQP is used. Default value is 'SLSQP'
+    :type method: string, optional
     :return: Optimized result
     :rtype: scipy.optimize.optimize.OptimizeResult
     """
+    if method not in ["SLSQP", "kkt"]:
+        raise Exception('method must be one of SLSQP or kkt')
+    if (method == "kkt") and (np.all(np.asarray(_coef) > 0) and np.all((np.asarray(_power) > 0) & (np.asarray(_power) < 1))):
+        return(kkt_optimization(_coef, _power, lower_bound, upper_bound, tot_constraint, contraint_type=contraint_type))
 
     _coef = pd.Series(_coef)
     _power = pd.Series(_power)
@@ -70,7 +183,8 @@ def mmm_optimize(_coef,
                  contraint_type="budget",
                  lower_bound=None,
                  upper_bound=None,
-                 maxiter=100):
+                 maxiter=100,
+                 method="SLSQP"):
     """ Optimize revenue/budget (Revenue= summation of coef * spend ^ power) based in initial value and constraint. Constraints
     is in form of lower bound, upper bound and either budget or revenue
 
@@ -90,6 +204,9 @@ def mmm_optimize(_coef,
     :type upper_bound: list of number, optional
     :param maxiter: maximum number of iteration
     :type maxiter: integer, optional
+    :param method: 'SLSQP' or 'kkt'. If 'kkt', closed form Lagrangian solver is used for concave revenue (positive coef and
+        0 < power < 1) and SLSQP otherwise. Default value is 'SLSQP'
+    :type method: string, optional
     :return: Optimized result representing optimized spend, optimized revenue and whether optimization was successful or not
     :rtype: tuple of array, number and bool
     """
@@ -105,5 +222,6 @@ def mmm_optimize(_coef,
                                 upper_bound,
                                 tot_constraint,
                                 contraint_type=contraint_type,
-                                maxiter=maxiter)
+                                maxiter=maxiter,
+                                method=method)
     return(optim_output.x, sum(np.multiply(_coef, np.power(optim_output.x, _power))), optim_output.success)
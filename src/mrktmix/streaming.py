@@ -0,0 +1,105 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from mrktmix.dataprep import transform as dp
+
+
+class StreamingApl:
+    """ Stateful advertisement decay (carry over effect or decay effect), diminishing return and lag transformation for data which is
+    appended over time. State of decay and lag is kept for each panel, so only new periods are transformed on update. Output is same as
+    apply_apl on all periods at once. Lead (negative lag) is not supported
+
+    :param all_vars: list of tuple of variable, adstock, power and lag
+    :type all_vars: list of tuple
+    """
+
+    def __init__(self, all_vars):
+        self.all_vars = list(all_vars)
+        self.panels = []
+        self.state = None
+
+    def fit(self, dframe):
+        """ Reset state and transform history
+
+        :param dframe: DataFrame with marketing or any other activities like spend. Date must be at level -1 of row index. If panel is
+            present, it should be at remaining levels
+        :type dframe: pandas.DataFrame
+        :return: Returns history after applying adstock, power and lag transformation
+        :rtype: pandas.DataFrame
+        """
+        self.panels = []
+        self.state = None
+        return(self.update(dframe))
+
+    def update(self, new_rows):
+        """ Transform new periods continuing from state of previous periods and update state. Panels not seen before start from first
+        period
+
+        :param new_rows: DataFrame with new periods of marketing or any other activities like spend. Date must be at level -1 of row
+            index. If panel is present, it should be at remaining levels
+        :type new_rows: pandas.DataFrame
+        :return: Returns new periods after applying adstock, power and lag transformation
+        :rtype: pandas.DataFrame
+        """
+        spec_index, variables = pd.factorize(pd.Series([var[0] for var in self.all_vars], dtype=object))
+        if new_rows.index.nlevels - 1:
+            panel_keys = [*new_rows.droplevel(-1).index]
+        else:
+            panel_keys = [None] * len(new_rows)
+        # add state for new panels
+        known_panels = set(self.panels)
+        new_panels = [*dict.fromkeys(i for i in panel_keys if i not in known_panels)]
+        if self.state is not None and len(new_panels):
+            self.state = {"decayed": np.concatenate([self.state["decayed"],
+                                                     np.zeros((len(new_panels),) + self.state["decayed"].shape[1:])]),
+                          "powered": np.concatenate([self.state["powered"],
+                                                     np.zeros(self.state["powered"].shape[:1] + (len(new_panels),)
+                                                              + self.state["powered"].shape[2:])], axis=1),
+                          "seen": np.concatenate([self.state["seen"], np.zeros(len(new_panels), dtype=int)])}
+        self.panels = self.panels + new_panels
+        panel_position = {panel: i for i, panel in enumerate(self.panels)}
+        panel_index = np.array([panel_position[i] for i in panel_keys], dtype=int)
+
+        # dense layout of new periods for all panels
+        position, periods = dp.panel_position_(panel_index)
+        periods = np.pad(periods, (0, len(self.panels) - len(periods)))
+        dense = np.zeros((periods.max(initial=0), len(self.panels), len(variables)))
+        dense[position, panel_index] = new_rows[[*variables]].to_numpy(dtype=float)
+        transformed, self.state = dp.apply_apl_step(dense,
+                                                    spec_index,
+                                                    [var[1] for var in self.all_vars],
+                                                    [var[2] for var in self.all_vars],
+                                                    [var[3] for var in self.all_vars],
+                                                    self.state,
+                                                    periods=periods)
+        df_transformed = pd.DataFrame(transformed[position, panel_index], index=new_rows.index,
+                                      columns=pd.MultiIndex.from_tuples(self.all_vars))
+        df_transformed.columns.names = ["Variable", "Adstock", "Power", "Lag"]
+        return(df_transformed)
+
+    def save(self, path):
+        """ Save specs and state, so transformation can be resumed later
+
+        :param path: path of file
+        :type path: str
+        """
+        with open(path, "wb") as state_file:
+            pickle.dump({"all_vars": self.all_vars, "panels": self.panels, "state": self.state}, state_file)
+
+    @classmethod
+    def load(cls, path):
+        """ Load specs and state saved by save
+
+        :param path: path of file
+        :type path: str
+        :return: transformer resuming from saved state
+        :rtype: mrktmix.StreamingApl
+        """
+        with open(path, "rb") as state_file:
+            saved = pickle.load(state_file)
+        streaming_apl = cls(saved["all_vars"])
+        streaming_apl.panels = saved["panels"]
+        streaming_apl.state = saved["state"]
+        return(streaming_apl)
@@ -1,8 +1,19 @@
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
 import numpy as np
 import pandas as pd
 
 from mrktmix.data_create import parse_variable
 from mrktmix.dataprep import transform as dp
+from mrktmix.dataprep.matrix import TransformedMatrix
+from mrktmix.dataprep.matrix import spec_columns
+from mrktmix.dataprep.matrix import spec_table
+from mrktmix.dataprep.panel import PanelLayout
+from mrktmix.dataprep.plan import TransformPlan
+from mrktmix.dataprep.summary import RangeSummary
+from mrktmix.dataprep.summary import period_summary_
 
 
 def create_base(variable, date_input, freq, increasing=False, negative=False, periods=1, panel=None):
@@ -47,7 +58,7 @@ def create_base(variable, date_input, freq, increasing=False, negative=False, pe
     return(base_df)
 
 
-def aggregate_data(mdl_data, panel_agg={}, variable_agg={}, metric_index_var=[-1], metric_mean_code=[], delimeter="_"):
+def aggregate_data(mdl_data, panel_agg={}, variable_agg={}, metric_index_var=[-1], metric_mean_code=[], delimeter="_", dtype=None):
     """
     Aggregate modeling data based on panel level or variable level. By defult, sum is used for aggregation.If mean function
     needs to be applied in modeling data at given code/level in variable,  metric index variable and metric mean code must
@@ -69,6 +80,9 @@ def aggregate_data(mdl_data, panel_agg={}, variable_agg={}, metric_index_var=[-1
     :type metric_mean_code: list of string
     :param delimeter: delimeter used in variable in modeling data
     :type delimeter: string
+    :param dtype: floating point type used in aggregation, e.g. numpy.float32 to halve memory. If None, type of modeling data is kept.
+        Default value is None
+    :type dtype: numpy.dtype, optional
     :return: modeling dataframe after aggregation at panel and variable level
     :rtype: pandas.DataFrame
     """
@@ -93,6 +107,8 @@ def aggregate_data(mdl_data, panel_agg={}, variable_agg={}, metric_index_var=[-1
     _ = [panel_agg_reverse.update({val_item: key}) for key, val in panel_agg.items() for val_item in val]
     # find variables for mean summary
     mdl_data_renamed = mdl_data.rename(index=panel_agg_reverse, columns=variable_agg_reverse)
+    if dtype is not None:
+        mdl_data_renamed = mdl_data_renamed.astype(dtype)
     mean_vars = parse_variable(
         pd.Series(
             mdl_data_renamed.columns.get_level_values(0),
@@ -175,46 +191,124 @@ def segregate_data(aggregated_data, segregated_data, panel_agg={}, variable_agg=
     return(panel_var_seg_data)
 
 
-def apply_apl(dframe, dict_apl):
+def apply_apl(dframe, dict_apl, cache=None, n_jobs=1, as_matrix=False, dtype=np.float64, gap=None):
     """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag on pandas.DataFrame
 
-    :param dframe: DataFrame with marketing or any other activities like spend
-    :type dframe: pandas.DataFrame
+    :param dframe: DataFrame with marketing or any other activities like spend. If PanelLayout is supplied and key of dictionary is
+        True, panels are found from offsets of layout and output rows follow rows of layout
+    :type dframe: pandas.DataFrame or mrktmix.PanelLayout
     :param dict_apl: Dictionary with list of Adstock, carry over effect or decay effect on activity. Key of the dictionary can be name of
         panel or Bool. If key is true, then transformation is applied at panel level. If key is false, then transformation is applied on
-        entire dataframe. If trasformation needs to be applied at panel level (name of panel should at level -2 in multiindex row
+        entire dataframe. If trasformation needs to be applied at panel level (name of panel should at level -2 in multiindex row.
+        Adstock can be tuple of kernel name and parameters, i.e. ("geometric", decay), ("delayed", decay, peak) or ("weibull", shape,
+        scale), to apply truncated convolution adstock
     :type dict_apl: dictionary with list values. Keys can be string or bool
+    :param cache: cache to reuse decayed and powered series across calls. Useful when same variables are transformed repeatedly with
+        different spec, defaults to None
+    :type cache: mrktmix.TransformCache, optional
+    :param n_jobs: number of worker processes. Input is shared with workers through shared memory and workers write into single
+        preallocated output, so neither input nor output is pickled. Cache is not used by worker processes, defaults to 1
+    :type n_jobs: int, optional
+    :param as_matrix: Returns compact TransformedMatrix instead of DataFrame with 4-level multiindex column, defaults to False
+    :type as_matrix: bool, optional
+    :param dtype: floating point type used in transformation, e.g. numpy.float32 to halve memory. Relative difference
+        of float32 output from float64 output is within 1e-5, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :param gap: treatment of missing periods (e.g. launch gap or blackout weeks) in decay. If "reset", carry over restarts after missing
+        periods. If "hold", carry over is held over missing periods. If None, missing value is carried in decay. Output of missing period
+        is 0, defaults to None
+    :type gap: str, optional
     :return: Returns input after applying adstock, power and lag transformation
-    :rtype: pandas.DataFrame
+    :rtype: pandas.DataFrame or mrktmix.TransformedMatrix
     """
+    if isinstance(dframe, PanelLayout) and ((len(dict_apl) == 1) and (True in dict_apl.keys())):
+        transformed = dp.apply_apl_layout(dframe, dict_apl[True], cache=cache, dtype=dtype, n_jobs=n_jobs, gap=gap)
+        return(transformed if as_matrix else transformed.to_frame())
+    if isinstance(dframe, PanelLayout):
+        dframe = dframe.to_frame()
     if (len(dict_apl) == 1) and (False in dict_apl.keys()):
         all_vars = dict_apl[False]
-        df_transformed = pd.concat([dp.apply_apl_series(dframe[var[0]], var[1], var[2], var[3]) for var in all_vars], axis=1)
+        transformed = dp.apply_apl_frame(dframe, all_vars, cache=cache, dtype=dtype, n_jobs=n_jobs, gap=gap)
     elif (len(dict_apl) == 1) and (True in dict_apl.keys()):
         all_vars = dict_apl[True]
-        df_grouped = dframe.groupby(dframe.droplevel(-1).index)
-        df_transformed = pd.concat([df_grouped[var[0]].transform(
-            lambda x: dp.apply_apl_series(x, var[1], var[2], var[3])) for var in all_vars], axis=1)
-        df_transformed.columns = pd.MultiIndex.from_tuples(all_vars)
+        transformed = dp.apply_apl_panel(dframe, all_vars, cache=cache, dtype=dtype, n_jobs=n_jobs, gap=gap)
     else:
-        df_transformed = pd.DataFrame()
-        for panel, all_vars in dict_apl.items():
-            df_transformed = pd.concat([df_transformed, pd.concat([dp.apply_apl_series(
-                dframe.loc[[panel], var[0]], var[1], var[2], var[3]) for var in all_vars], axis=1)])
-    df_transformed.columns.names = ["Variable", "Adstock", "Power", "Lag"]
-    return(df_transformed)
+        row_position = pd.Series(np.arange(len(dframe)), index=dframe.index)
+        panel_rows = [row_position.loc[[panel]].to_numpy() for panel in dict_apl.keys()]
+        panel_columns = [spec_columns(spec_table(all_vars)) for all_vars in dict_apl.values()]
+        # single preallocated output with union of transformed columns of all panels
+        all_columns = reduce(lambda x, y: x.union(y), panel_columns)
+        all_rows = np.cumsum([0] + [len(rows) for rows in panel_rows])
+        if n_jobs > 1:
+            variables = pd.unique(all_columns.get_level_values(0))
+            tasks = [{"spec_index": pd.Index(variables).get_indexer(columns.get_level_values(0)),
+                      "adstock": columns.get_level_values(1).to_numpy(),
+                      "power": columns.get_level_values(2).to_numpy(),
+                      "lag": columns.get_level_values(3).to_numpy(),
+                      "columns": all_columns.get_indexer(columns),
+                      "rows": rows,
+                      "output_rows": (all_rows[i], all_rows[i + 1]),
+                      "gap": gap} for i, (rows, columns) in enumerate(zip(panel_rows, panel_columns))]
+            df_values = dp.apply_apl_parallel(dframe[[*variables]].to_numpy(dtype=dtype), tasks, (all_rows[-1], len(all_columns)), n_jobs)
+        else:
+            df_values = np.full((all_rows[-1], len(all_columns)), np.nan, dtype=dtype)
+            for i, (rows, all_vars) in enumerate(zip(panel_rows, dict_apl.values())):
+                df_values[all_rows[i]:all_rows[i + 1], all_columns.get_indexer(panel_columns[i])] = \
+                    dp.apply_apl_frame(dframe.iloc[rows], all_vars, cache=cache, dtype=dtype, gap=gap).values
+        transformed = TransformedMatrix(df_values, [*all_columns], dframe.index[np.concatenate(panel_rows)])
+    if as_matrix:
+        return(transformed)
+    return(transformed.to_frame())
+
 
+def apply_apl_memmap(dframe, dict_apl, path, chunk_size=1000, cache=None, dtype=np.float64):
+    """ Apply advertisement decay (carry over effect or decay effect), diminishing return and lag on pandas.DataFrame and write output
+    to memory mapped file in chunks of specs. Spec and row index are written to file with suffix .meta. Transformation bigger than
+    memory can be written and later opened without copy by mrktmix.TransformedMatrix.open_memmap
 
-def apply_coef_(raw_data, coef, dep_series):
+    :param dframe: DataFrame with marketing or any other activities like spend
+    :type dframe: pandas.DataFrame
+    :param dict_apl: Dictionary with list of Adstock, carry over effect or decay effect on activity. Key of the dictionary must be Bool.
+        If key is true, then transformation is applied at panel level. If key is false, then transformation is applied on entire
+        dataframe
+    :type dict_apl: dictionary with list values. Keys can be bool
+    :param path: path of memory mapped file
+    :type path: str
+    :param chunk_size: number of specs transformed and written at once. Specs of same variable and adstock are kept in same chunk,
+        defaults to 1000
+    :type chunk_size: int, optional
+    :param cache: cache to reuse decayed and powered series across chunks, defaults to None
+    :type cache: mrktmix.TransformCache, optional
+    :param dtype: floating point type of output, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :return: Returns input after applying adstock, power and lag transformation with read only memory mapped values
+    :rtype: mrktmix.TransformedMatrix
+    """
+    if (len(dict_apl) != 1) or (list(dict_apl.keys())[0] not in [True, False]):
+        raise Exception('Memory mapped output can only be created when key of dictionary is True or False')
+    panel, all_vars = [*dict_apl.items()][0]
+    transformed = TransformedMatrix.create_memmap(path, all_vars, dframe.index, dtype=dtype)
+    TransformPlan(all_vars).execute(dframe, panel=panel, batch_size=chunk_size, cache=cache, dtype=dtype, out=transformed)
+    transformed.flush()
+    del transformed
+    return(TransformedMatrix.open_memmap(path))
+
+
+def apply_coef_(raw_data, coef, dep_series, dtype=np.float64):
     """ Apply coefficient and transformation on raw data
 
-    :param raw_data: modeling dataframe with date index at level -1. If panel is present, it should be at level -2.
-    :type raw_data: pandas.DataFrame
+    :param raw_data: modeling dataframe with date index at level -1. If panel is present, it should be at level -2. If TransformedMatrix
+        is supplied, it is used as transformed data and transformation is not applied again. If PanelLayout is supplied, rows of each
+        panel are found from offsets of layout
+    :type raw_data: pandas.DataFrame or mrktmix.TransformedMatrix or mrktmix.PanelLayout
     :param coef: Coefficient and parameter to be applied on modeling dataframe. Coefficient should have tuple of variable, adstock,power
         and lag at index level -1. If panel is present in modeling data, then coefficient must have panel information in index at level -2.
     :type coef: pandas.Series
     :param dep_series: Dependent Series will be used to calculate residual. It must be at same level modeling dataframe
     :type dep_series: pandas.Series or None
+    :param dtype: floating point type used in transformation and decomposition, e.g. numpy.float32 to halve memory. Relative difference
+        of float32 output from float64 output is within 1e-5, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
     :return: Decomposition of dependent series
     :rtype: pandas.DataFrame
     """
@@ -228,24 +322,43 @@ def apply_coef_(raw_data, coef, dep_series):
     else:
         panel_var = {False: [*coef.index]}
 
-    after_apl = apply_apl(raw_data, panel_var)
+    if isinstance(raw_data, PanelLayout):
+        raw_data = apply_apl(raw_data, {True: [*dict.fromkeys(coef.index.get_level_values(-1))]}, as_matrix=True, dtype=dtype)
+    if isinstance(raw_data, TransformedMatrix):
+        rows = raw_data.index.droplevel(-1).isin([*panel_var.keys()]) if coef.index.nlevels - 1 else None
+        after_apl = raw_data.select([*dict.fromkeys(coef.index.get_level_values(-1))], rows=rows)
+    else:
+        after_apl = apply_apl(raw_data, panel_var, dtype=dtype, as_matrix=True)
+    # align transformed data and coefficient once by integer position and decompose in single broadcasted multiply
+    coef = coef.astype(dtype)
+    after_columns = after_apl.columns
     if coef.index.nlevels - 1:
         coef2frame = coef.unstack()
-        coef2frame.columns = pd.MultiIndex.from_tuples(coef2frame.columns)
-        dep_decomposition = after_apl[coef2frame.columns].mul(coef2frame.reindex(after_apl.index, level=0))
+        columns = after_columns.get_indexer(pd.MultiIndex.from_tuples(coef2frame.columns))
+        if (columns < 0).any():
+            raise Exception('Coefficient is present for variable which is not present in transformed data')
+        panel_position = coef2frame.index.get_indexer(after_apl.index.get_level_values(0))
+        coef_matrix = np.vstack([coef2frame.to_numpy(dtype=dtype), np.full((1, len(columns)), np.nan, dtype=dtype)])[panel_position]
     else:
-        dep_decomposition = after_apl.mul(coef)
+        columns = np.arange(len(after_columns))
+        coef_matrix = np.append(coef.to_numpy(dtype=dtype), np.array(np.nan, dtype=dtype))[
+            pd.MultiIndex.from_tuples(coef.index).get_indexer(after_columns)]
+    contribution = np.empty((len(after_apl), len(columns) + (dep_series is not None)), dtype=dtype)
+    np.multiply(after_apl.values.astype(dtype, copy=False)[:, columns], coef_matrix, out=contribution[:, :len(columns)])
+    columns = after_columns[columns]
     if dep_series is not None:
-        dep_decomposition[("Residual", 0, 1, 0)] = dep_series - dep_decomposition.sum(axis=1)
-    return(dep_decomposition)
+        contribution[:, -1] = dep_series.astype(dtype).reindex(after_apl.index).to_numpy() - np.nansum(contribution[:, :-1], axis=1)
+        columns = columns.append(pd.MultiIndex.from_tuples([("Residual", 0, 1, 0)]))
+    return(pd.DataFrame(contribution, index=after_apl.index, columns=columns))
 
 
-def apply_coef_node_(mdl_data, coef, nodes, node, node_split):
+def apply_coef_node_(mdl_data, coef, nodes, node, node_split, dtype=np.float64):
     """
     Apply coef on modeling data to create decomposition.
 
-    :param mdl_data: modeling dataframe with date index at level -1. If panel is present, it should be at level -2.
-    :type mdl_data: pandas.DataFrame
+    :param mdl_data: modeling dataframe with date index at level -1. If panel is present, it should be at level -2. If TransformedMatrix
+        is supplied, it is used as transformed data of drivers and node, and transformation is not applied again
+    :type mdl_data: pandas.DataFrame or mrktmix.TransformedMatrix
     :param coef: Coefficient to be applied on modeling dataframe. Coefficient should have tuple of variable, adstock,power
         and lag at index level -1. If panel is present in modeling data, then coefficient must have panel information in index at level -2.
     :type coef: pandas.Series
@@ -257,15 +370,19 @@ def apply_coef_node_(mdl_data, coef, nodes, node, node_split):
     :type dep_series: string
     :param node_split: Total number of relationshipship for the given node. It will equally seperate decomposition in-between the nodes
     :type node_split: int
+    :param dtype: floating point type used in transformation and decomposition, e.g. numpy.float32 to halve memory. Relative difference
+        of float32 output from float64 output is within 1e-5, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
     :return: Decomposition of dependent series for given node
     :rtype: pandas.DataFrame
     """
 
     # apply apl and create model decomposition
-    df_apl = apply_coef_(
-        mdl_data,
-        coef[nodes == node],
-        apply_apl(mdl_data, {False: [node]}).iloc[:, 0])
+    if isinstance(mdl_data, TransformedMatrix):
+        node_series = pd.Series(mdl_data[node].astype(dtype, copy=False), index=mdl_data.index)
+    else:
+        node_series = apply_apl(mdl_data, {False: [node]}, dtype=dtype).iloc[:, 0]
+    df_apl = apply_coef_(mdl_data, coef[nodes == node], node_series, dtype=dtype)
     # Decomposition of nodes
     if node_split:
         adj_decomposition = pd.concat([
@@ -279,91 +396,273 @@ def apply_coef_node_(mdl_data, coef, nodes, node, node_split):
     return(dep_decomposition)
 
 
-def apply_coef(mdl_data, coef, nodes=None, dep_series=None):
+def apply_coef_panel_(mdl_data, coef, nodes, panel, dtype=np.float64):
+    """ Decomposition of all nodes of given panel
+
+    :param mdl_data: transformed data of given panel
+    :type mdl_data: mrktmix.TransformedMatrix
+    :param coef: Coefficient of given panel with panel at index level -2
+    :type coef: pandas.Series
+    :param nodes: Relationship between indepenent variable and node of given panel with panel at index level -2
+    :type nodes: pandas.Series
+    :param panel: name of panel
+    :type panel: str
+    :param dtype: floating point type used in decomposition, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :return: Decomposition of all nodes of given panel
+    :rtype: pandas.DataFrame
+    """
+    # count of nodes
+    nodes_count = {node: sum(coef[panel][nodes[panel] != node].index == node) for node in nodes[panel].unique()}
+    return(pd.concat([apply_coef_node_(mdl_data, coef, nodes, node, node_split, dtype=dtype) for node, node_split in nodes_count.items()],
+                     axis=1))
+
+
+def apply_coef(mdl_data, coef, nodes=None, dep_series=None, dtype=np.float64, n_jobs=1, errors="raise"):
     """
     Apply coef on modeling data to create decomposition. If given node is present more than one relationships, then decomposed
     series is equally divided into the independent nodes.
 
-    :param mdl_data: modeling dataframe with date index at level -1. If panel is present, it should be at level -2.
-    :type mdl_data: pandas.DataFrame
+    :param mdl_data: modeling dataframe with date index at level -1. If panel is present, it should be at level -2. If TransformedMatrix
+        is supplied, it is used as transformed data and transformation is not applied again
+    :type mdl_data: pandas.DataFrame or mrktmix.TransformedMatrix
     :param coef: Coefficient to be applied on modeling dataframe. Coefficient should have tuple of variable, adstock,power
         and lag at index level -1. If panel is present in modeling data, then coefficient must have panel information in index at level -2.
     :type coef: pandas.Series
     :param nodes: Relationship between indepenent variable and node to be applied on modeling dataframe. Nodes should
     have tuple of independent variable, adstock,power and lag at index level -1. If panel is present in modeling data, then nodes
-    must have panel information in index at level -2. Dependent variables should be as value of series. Default value is None
+    must have panel information in index at level -2. Dependent variables should be as value of series. Transformation of every
+    driver and node is computed once and shared by decomposition of all nodes. Default value is None
     :type nodes: pandas.Series
     :param dep_series: Dependent Series will be used to calculate residual. It must be at same level modeling dataframe. Default
     is None. If dependent is not None, then residuals will also be calculated
     :type dep_series: pandas.Series or None
+    :param dtype: floating point type used in transformation and decomposition, e.g. numpy.float32 to halve memory. Relative difference
+        of float32 output from float64 output is within 1e-5, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :param n_jobs: number of worker processes across which panels are decomposed. Decomposition of all panels is assembled once at
+        end, defaults to 1
+    :type n_jobs: int, optional
+    :param errors: 'raise' to raise error of first failed panel or 'warn' to warn about failed panels and return decomposition of
+        remaining panels. Failed panels and their errors are kept in attrs['failed_panels'] of output, defaults to 'raise'
+    :type errors: str, optional
     :return: Decomposition of dependent series for given node
     :rtype: pandas.DataFrame
     """
+    if errors not in ["raise", "warn"]:
+        raise Exception('errors must be one of raise or warn')
     if nodes is None:
         # no nodes are present. simple case of decomposition
-        return(apply_coef_(mdl_data, coef, dep_series))
+        return(apply_coef_(mdl_data, coef, dep_series, dtype=dtype))
     else:
+        # every transformation of drivers and nodes is computed once in shared block
+        if not isinstance(mdl_data, TransformedMatrix):
+            plan = TransformPlan([*dict.fromkeys([*coef.index.get_level_values(-1)] + [*nodes.values])])
+            mdl_data = plan.execute(mdl_data, panel=nodes.index.nlevels == 2, dtype=dtype)
         # Panel is present
         if nodes.index.nlevels == 2:
-            network_decomposition = pd.DataFrame()
-            for panel in nodes.index.get_level_values(0).unique():
-                # count of nodes
-                nodes_count = {node: sum(coef[panel][nodes[panel] != node].index == node) for node in nodes[panel].unique()}
-                panel_decomposition = pd.concat([
-                    apply_coef_node_(mdl_data.loc[[(panel)], :],
-                                     coef[[panel]],
-                                     nodes[[panel]],
-                                     node,
-                                     node_split) for node, node_split in nodes_count.items()], axis=1)
-                network_decomposition = pd.concat([network_decomposition, panel_decomposition])
+            panels = [*nodes.index.get_level_values(0).unique()]
+            panel_args = [(mdl_data.select(rows=mdl_data.index.get_level_values(0) == panel), coef[coef.index.get_level_values(0) == panel],
+                           nodes[nodes.index.get_level_values(0) == panel], panel)
+                          for panel in panels]
+            if n_jobs > 1:
+                with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                    jobs = [executor.submit(apply_coef_panel_, *args, dtype=dtype) for args in panel_args]
+                    panel_result = [job.exception() or job.result() for job in jobs]
+            else:
+                panel_result = []
+                for args in panel_args:
+                    try:
+                        panel_result.append(apply_coef_panel_(*args, dtype=dtype))
+                    except Exception as error:
+                        panel_result.append(error)
+            # failed panels are reported and decomposition of remaining panels is assembled once
+            failed_panels = {panel: result for panel, result in zip(panels, panel_result) if isinstance(result, BaseException)}
+            if len(failed_panels) and (errors == "raise"):
+                raise [*failed_panels.values()][0]
+            elif len(failed_panels):
+                warnings.warn('Decomposition failed for panels: {}'.format(
+                    ", ".join("{} ({!r})".format(panel, error) for panel, error in failed_panels.items())))
+            panel_decomposition = [result for result in panel_result if not isinstance(result, BaseException)]
+            network_decomposition = pd.concat([pd.DataFrame()] + panel_decomposition)
+            network_decomposition.attrs["failed_panels"] = failed_panels
         # Panel is not present
         else:
             # count of nodes
             nodes_count = {node: sum(coef[nodes != node].index == node) for node in nodes.unique()}
-            network_decomposition = pd.concat([apply_coef_node_(mdl_data, coef, nodes, node, node_split)
+            network_decomposition = pd.concat([apply_coef_node_(mdl_data, coef, nodes, node, node_split, dtype=dtype)
                                                for node, node_split in nodes_count.items()], axis=1)
         return(network_decomposition)
 
 
 def collapse_date(dep_decompose, date_dict):
-    """ Summarise data after collapsing date (index at level -1). Summarization is based on date dictionary given in input.
+    """ Summarise data after collapsing date (index at level -1). Summarization is based on date dictionary given in input. Dates are
+    bucketed once and total of every period is difference of cumulative sum over sorted dates (mrktmix.RangeSummary), so periods can
+    overlap.
 
     :param dep_decompose: data to be summarised. date should be index with level -1.
-    :type dep_decompose: pandas.DataFrame
+    :type dep_decompose: pandas.DataFrame or mrktmix.TransformedMatrix or mrktmix.PanelLayout
     :param date_dict: dictionary with name and tuples of dates. Dates are inclusive.
     :type date_dict: dictionary
     :return: Summarise after collpasing date
     :rtype: pandas.DataFrame
     """
-    all_decomp_smry = []
-    for key, val in date_dict.items():
-        selected_date = [upp_lim == low_lim for upp_lim, low_lim in zip(
-            val[1] >= dep_decompose.index.get_level_values(-1), dep_decompose.index.get_level_values(-1) >= val[0])]
-        if dep_decompose.index.nlevels - 1:
-            decomp_smry = dep_decompose.iloc[selected_date].sum(level=range(0, dep_decompose.index.nlevels - 1))
-        else:
-            decomp_smry = dep_decompose.iloc[selected_date].sum()
-        if isinstance(decomp_smry, pd.Series):
-            decomp_smry = decomp_smry.rename(key)
-        else:
-            decomp_smry = decomp_smry.stack(list(range(0, dep_decompose.columns.nlevels))).rename(key)
-        if len(all_decomp_smry):
-            all_decomp_smry = pd.concat([all_decomp_smry, decomp_smry], axis=1)
-        else:
-            all_decomp_smry = decomp_smry.to_frame()
-    return(all_decomp_smry)
+    return(RangeSummary(dep_decompose).collapse(date_dict))
+
+
+def summarize_coef(mdl_data, coef, date_dict, dep_series=None, batch_size=None, dtype=np.float64):
+    """ Summarise decomposition after collapsing date without creating decomposition of every row. Contribution is linear in
+    coefficient, so total of period is coefficient times total of transformed variable in period. Panels are transformed one at a time
+    and only totals of every period are kept, so memory of output is in order of periods x specs instead of rows x specs. Output is
+    same as collapse_date(apply_coef(mdl_data, coef, dep_series=dep_series), date_dict) within floating point tolerance
+
+    :param mdl_data: modeling dataframe with date index at level -1. If panel is present, it should be at level -2. If TransformedMatrix
+        is supplied, it is used as transformed data and transformation is not applied again
+    :type mdl_data: pandas.DataFrame or mrktmix.TransformedMatrix or mrktmix.PanelLayout
+    :param coef: Coefficient to be applied on modeling dataframe. Coefficient should have tuple of variable, adstock,power
+        and lag at index level -1. If panel is present in modeling data, then coefficient must have panel information in index at level -2.
+    :type coef: pandas.Series
+    :param date_dict: dictionary with name and tuples of dates. Dates are inclusive.
+    :type date_dict: dictionary
+    :param dep_series: Dependent Series will be used to calculate total of residual. It must be at same level modeling dataframe.
+        Default is None
+    :type dep_series: pandas.Series or None
+    :param batch_size: maximum number of specs of panel transformed at once. All specs of panel are transformed at once if None,
+        defaults to None
+    :type batch_size: int, optional
+    :param dtype: floating point type used in transformation and summary, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :return: Summarise of decomposition after collpasing date
+    :rtype: pandas.DataFrame
+    """
+    if coef.index.nlevels != mdl_data.index.nlevels:
+        raise Exception('Mismatch of index in input data')
+    if isinstance(mdl_data, PanelLayout):
+        mdl_data = mdl_data.to_frame()
+    coef = coef.astype(dtype)
+    if coef.index.nlevels - 1:
+        coef2frame = coef.unstack()
+        panels = coef2frame.index
+        # rows of every panel from single stable sort of panel position
+        panel_index = panels.get_indexer(mdl_data.index.droplevel(-1))
+        order = np.argsort(panel_index, kind="stable")
+        offsets = np.searchsorted(panel_index[order], np.arange(len(panels) + 1))
+        all_rows = [order[offsets[i]:offsets[i + 1]] for i in range(len(panels))]
+        all_vars = [*coef2frame.columns]
+        coef_matrix = coef2frame.to_numpy(dtype=dtype)
+    else:
+        panels = None
+        all_rows = [np.arange(len(mdl_data))]
+        all_vars = [*dict.fromkeys(coef.index)]
+        coef_matrix = coef.groupby(level=0, sort=False).first().reindex(all_vars).to_numpy(dtype=dtype)[np.newaxis]
+    dates = mdl_data.index.get_level_values(-1)
+    totals = np.zeros((len(date_dict), len(all_rows), len(all_vars) + (dep_series is not None)), dtype=dtype)
+    for i, rows in enumerate(all_rows):
+        # membership of rows of panel in every period
+        selected_date = np.zeros((len(date_dict), len(rows)), dtype=bool)
+        for j, val in enumerate(date_dict.values()):
+            selected_date[j] = (dates[rows] >= val[0]) & (dates[rows] <= val[1])
+        columns = np.flatnonzero(~np.isnan(coef_matrix[i]))
+        if dep_series is not None:
+            dep = dep_series.astype(dtype).reindex(mdl_data.index[rows]).to_numpy()
+            selected_dep = (selected_date & ~np.isnan(dep)).astype(dtype)
+            totals[:, i, -1] = selected_dep @ np.nan_to_num(dep)
+        for batch in TransformPlan([all_vars[k] for k in columns]).batches(batch_size):
+            batch_vars = [all_vars[k] for k in columns[batch]]
+            if isinstance(mdl_data, TransformedMatrix):
+                after_apl = np.nan_to_num(mdl_data.values[rows][:, mdl_data.position(batch_vars)].astype(dtype))
+            else:
+                after_apl = np.nan_to_num(dp.apply_apl_frame(mdl_data.iloc[rows], batch_vars, dtype=dtype).values)
+            totals[:, i, columns[batch]] = (selected_date.astype(dtype) @ after_apl) * coef_matrix[i, columns[batch]]
+            if dep_series is not None:
+                totals[:, i, -1] -= (selected_dep @ after_apl) @ coef_matrix[i, columns[batch]]
+        if panels is not None:
+            totals[~selected_date.any(axis=1), i] = np.nan
+    all_vars = all_vars + [("Residual", 0, 1, 0)] * (dep_series is not None)
+    return(period_summary_(totals, [*date_dict.keys()], spec_columns(spec_table(all_vars)), panels))
 
 
 def assess_error(dep_decompose):
     """ Create actual vs predicted with error terms from given resonse decomposition
 
     :param dep_decompose: data with decomposition of response variable and Residual term
-    :type dep_decompose: pandas.DataFrame
+    :type dep_decompose: pandas.DataFrame or mrktmix.TransformedMatrix
     :return: dataframe with actual, predicted, error and error % to measure accury of model
     :rtype: pandas.DataFrame
     """
+    if isinstance(dep_decompose, TransformedMatrix):
+        dep_decompose = dep_decompose.to_frame()
     dep = dep_decompose.sum(axis=1).rename("Dependent")
     pred = dep_decompose.drop("Residual", axis=1, level=-4).sum(axis=1).rename("Predicted")
     residual = (dep - pred).rename("Error")
     residual_perc = (residual / dep).rename("Error %")
     return(pd.concat([dep, pred, residual, residual_perc], axis=1))
+
+
+def assess_models(dep_series, predictions, n_params=None, by_panel=False):
+    """ Fit statistics of many models against one dependent series in single matrix pass. Statistics are number of observations, MAPE
+    (as fraction like Error % of assess_error), RMSE, R2, adjusted R2 and Durbin Watson. Rows with missing dependent or prediction are
+    left out of statistics of that model, and Durbin Watson uses consecutive dates within panel
+
+    :param dep_series: Dependent series with date index at level -1. If panel is present, it should be at remaining levels
+    :type dep_series: pandas.Series
+    :param predictions: prediction of every model in column, e.g. Predicted of assess_error of each model. DataFrame is aligned with
+        index of dependent series and array must be in row order of dependent series
+    :type predictions: pandas.DataFrame or numpy.ndarray
+    :param n_params: number of parameters of every model (excluding intercept) used in adjusted R2. Adjusted R2 is NaN if None,
+        defaults to None
+    :type n_params: Union[int, list, pandas.Series], optional
+    :param by_panel: statistics of every panel and model if True, else statistics of every model over all panels, defaults to False
+    :type by_panel: bool, optional
+    :return: statistics with model (panel and model if by_panel is True) in row index
+    :rtype: pandas.DataFrame
+    """
+    if isinstance(predictions, pd.DataFrame):
+        models = predictions.columns
+        pred = predictions.reindex(dep_series.index).to_numpy(dtype=float)
+    else:
+        pred = np.asarray(predictions, dtype=float).reshape(len(dep_series), -1)
+        models = pd.RangeIndex(pred.shape[1])
+    if dep_series.index.nlevels - 1:
+        panel_index, panels = pd.factorize(dep_series.index.droplevel(-1), sort=True)
+    else:
+        panel_index, panels = np.zeros(len(dep_series), dtype=int), None
+    if by_panel and (panels is None):
+        raise Exception('Panel must be present at level -2 of row index')
+    # rows of every panel together in order of date
+    order = np.lexsort((pd.factorize(dep_series.index.get_level_values(-1), sort=True)[0], panel_index))
+    order = order[panel_index[order] >= 0]
+    panel_index = panel_index[order]
+    group = panel_index if by_panel else np.zeros(len(order), dtype=int)
+    starts = np.flatnonzero(np.diff(group, prepend=-1))
+    dep = dep_series.to_numpy(dtype=float)[order][:, np.newaxis]
+    error = dep - pred[order]
+    valid = ~np.isnan(error)
+    error = np.where(valid, error, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n_obs = np.add.reduceat(valid, starts, axis=0)
+        sse = np.add.reduceat(error**2, starts, axis=0)
+        dep_mean = np.add.reduceat(np.where(valid, dep, 0), starts, axis=0) / n_obs
+        sst = np.add.reduceat(np.where(valid, (dep - np.repeat(dep_mean, np.diff(np.append(starts, len(order))), axis=0))**2, 0),
+                              starts, axis=0)
+        valid_perc = valid & (dep != 0)
+        mape = np.add.reduceat(np.where(valid_perc, np.abs(error / dep), 0), starts, axis=0) / np.add.reduceat(valid_perc, starts, axis=0)
+        # squared difference of consecutive errors within panel
+        error_diff = np.zeros_like(error)
+        error_diff[1:] = np.where(valid[1:] & valid[:-1] & (panel_index[1:] == panel_index[:-1])[:, np.newaxis],
+                                  error[1:] - error[:-1], 0)**2
+        durbin_watson = np.add.reduceat(error_diff, starts, axis=0) / sse
+        r_square = 1 - sse / sst
+        if n_params is None:
+            adj_r_square = np.full_like(r_square, np.nan)
+        else:
+            n_params = n_params.reindex(models) if isinstance(n_params, pd.Series) else n_params
+            adj_r_square = 1 - (1 - r_square) * (n_obs - 1) / (n_obs - np.asarray(n_params, dtype=float) - 1)
+        statistics = np.stack([n_obs, mape, np.sqrt(sse / n_obs), r_square, adj_r_square, durbin_watson], axis=-1)
+    columns = ["Observations", "MAPE", "RMSE", "R2", "Adjusted R2", "Durbin Watson"]
+    if by_panel:
+        index = pd.MultiIndex.from_product([panels[group[starts]], models])
+    else:
+        index = models
+    statistics = pd.DataFrame(statistics.reshape(-1, len(columns)), index=index, columns=columns)
+    return(statistics.astype({"Observations": int}))
@@ -0,0 +1,105 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from mrktmix.dataprep.matrix import TransformedMatrix
+from mrktmix.dataprep.plan import TransformPlan
+from mrktmix.transformation import apply_coef_
+from mrktmix.transformation import assess_models
+
+
+def backtest_fold_(transformed, dep_series, coef, train, fit=None, dtype=np.float64):
+    """ Prediction of one fold of backtest
+
+    :param transformed: transformed data of rows of fold
+    :type transformed: mrktmix.TransformedMatrix
+    :param dep_series: Dependent series in row order of transformed data
+    :type dep_series: pandas.Series
+    :param coef: Coefficient to be applied on transformed data
+    :type coef: pandas.Series
+    :param train: boolean mask of training rows of transformed data
+    :type train: numpy.ndarray
+    :param fit: function to fit coefficient on training rows, defaults to None
+    :type fit: callable, optional
+    :param dtype: floating point type used in decomposition, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :return: prediction in row order of transformed data
+    :rtype: numpy.ndarray
+    """
+    if fit is not None:
+        coef = fit(transformed.select(rows=train), dep_series[train], coef)
+    return(apply_coef_(transformed, coef, None, dtype=dtype).sum(axis=1).reindex(transformed.index).to_numpy())
+
+
+def backtest(mdl_data, coef, dep_series, origins, horizon=1, fit=None, n_jobs=1, by_panel=False, dtype=np.float64):
+    """ Rolling origin evaluation of model. For every origin, periods till origin are training periods and next horizon periods are
+    holdout periods. Adstock and lag are causal, so data is transformed once on full history and rows of every fold are taken from
+    it (lead, i.e. negative lag, uses periods after origin). Fit statistics of training and holdout periods of all folds are computed
+    together in single pass of mrktmix.assess_models
+
+    :param mdl_data: modeling dataframe with date index at level -1. If panel is present, it should be at level -2. If TransformedMatrix
+        is supplied, it is used as transformed data and transformation is not applied again
+    :type mdl_data: pandas.DataFrame or mrktmix.TransformedMatrix
+    :param coef: Coefficient to be applied on modeling dataframe. Coefficient should have tuple of variable, adstock,power
+        and lag at index level -1. If panel is present in modeling data, then coefficient must have panel information in index at level -2.
+    :type coef: pandas.Series
+    :param dep_series: Dependent series at same level as modeling dataframe
+    :type dep_series: pandas.Series
+    :param origins: last training date of every fold
+    :type origins: list
+    :param horizon: number of holdout periods after origin, defaults to 1
+    :type horizon: int, optional
+    :param fit: function to refit coefficient on training periods of every fold. It is called as fit(transformed, dep_series, coef)
+        with transformed data and dependent series of training rows, and must return coefficient with same index as coef. Coefficient
+        is applied as is in every fold if None, defaults to None
+    :type fit: callable, optional
+    :param n_jobs: number of worker processes across which folds are fitted. Fit must be picklable, defaults to 1
+    :type n_jobs: int, optional
+    :param by_panel: fit statistics of every panel if True, defaults to False
+    :type by_panel: bool, optional
+    :param dtype: floating point type used in transformation and decomposition, defaults to numpy.float64
+    :type dtype: numpy.dtype, optional
+    :return: fit statistics with one row for every origin and sample (Train or Test), and panel if by_panel is True
+    :rtype: pandas.DataFrame
+    """
+    if not isinstance(mdl_data, TransformedMatrix):
+        plan = TransformPlan([*dict.fromkeys(coef.index.get_level_values(-1))])
+        mdl_data = plan.execute(mdl_data, panel=coef.index.nlevels == 2, dtype=dtype)
+    dep_series = dep_series.reindex(mdl_data.index)
+    date_index, dates = pd.factorize(mdl_data.index.get_level_values(-1), sort=True)
+    date_index = np.where(date_index < 0, len(dates), date_index)
+    all_folds = []
+    for origin in origins:
+        n_train = dates.searchsorted(origin, side="right")
+        train = date_index < n_train
+        test = (date_index >= n_train) & (date_index < n_train + horizon)
+        if not (train.any() and test.any()):
+            raise Exception('No training or holdout period for origin {}'.format(origin))
+        all_folds.append((train, test))
+    # prediction of every fold on rows of fold
+    if fit is None:
+        predicted = backtest_fold_(mdl_data, dep_series, coef, None, dtype=dtype)
+        fold_predicted = [predicted[train | test] for train, test in all_folds]
+    else:
+        fold_args = [(mdl_data.select(rows=train | test), dep_series[train | test], coef, train[train | test])
+                     for train, test in all_folds]
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                fold_predicted = [*executor.map(backtest_fold_, *zip(*fold_args), [fit] * len(fold_args), [dtype] * len(fold_args))]
+        else:
+            fold_predicted = [backtest_fold_(*args, fit=fit, dtype=dtype) for args in fold_args]
+    predictions = np.full((len(mdl_data), 2 * len(all_folds)), np.nan)
+    for i, ((train, test), predicted) in enumerate(zip(all_folds, fold_predicted)):
+        predictions[train, 2 * i] = predicted[train[train | test]]
+        predictions[test, 2 * i + 1] = predicted[test[train | test]]
+    n_params = len(set(spec for spec in coef.index.get_level_values(-1) if spec[0] != "Intercept"))
+    statistics = assess_models(dep_series, predictions, n_params=n_params, by_panel=by_panel)
+    # one row for every origin and sample
+    model = statistics.index.get_level_values(-1).to_numpy()
+    fold_statistics = pd.DataFrame({"Origin": [origins[i] for i in model // 2],
+                                    "Sample": np.array(["Train", "Test"])[model % 2]})
+    if by_panel:
+        fold_statistics["Panel"] = statistics.index.get_level_values(0)
+    fold_statistics = pd.concat([fold_statistics, statistics.reset_index(drop=True)], axis=1)
+    return(fold_statistics.iloc[np.lexsort((np.arange(len(model)), model % 2, model // 2))].reset_index(drop=True))
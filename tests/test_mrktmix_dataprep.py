@@ -3,6 +3,39 @@ import pandas as pd
 from pytest import approx
 
 from mrktmix.dataprep import transform as dp
+from mrktmix.dataprep.cache import TransformCache
+from mrktmix.dataprep.matrix import TransformedMatrix
+from mrktmix.dataprep.panel import PanelLayout
+from mrktmix.dataprep.plan import TransformPlan
+
+
+def test_lag_():
+    input_array = np.array([1., 2., 3., 4., 5.])
+    # integer lag and lead
+    assert all(dp.lag_(input_array, 0) == [1., 2., 3., 4., 5.])
+    assert all(dp.lag_(input_array, 2) == [0., 0., 1., 2., 3.])
+    assert all(dp.lag_(input_array, -1) == [2., 3., 4., 5., 0.])
+    assert all(dp.lag_(input_array, 6) == [0., 0., 0., 0., 0.])
+    # fractional lag and lead
+    assert dp.lag_(input_array, 1.5) == approx([0., 0., 1.5, 2.5, 3.5])
+    assert dp.lag_(input_array, -.5) == approx([1.5, 2.5, 3.5, 4.5, 0.])
+    # lag for each column of 2-D block
+    input_array = np.array([[1., 10., 100.], [2., 20., 200.], [3., 30., 300.]])
+    output = dp.lag_(input_array, [1, .5, 1])
+    assert output[:, 0] == approx([0., 1., 2.])
+    assert output[:, 1] == approx([0., 15., 25.])
+    assert output[:, 2] == approx([0., 100., 200.])
+
+
+def test_power_():
+    input_array = np.array([[100., 0.], [50., -2.], [10., np.nan], [0., 4.]])
+    power = [.9, .5, 1, .5, -1, 0]
+    column_index = [0, 0, 1, 1, 1, 1]
+    output = dp.power_(input_array, power, column_index)
+    expected_output = np.nan_to_num(np.power(input_array[:, column_index], power))
+    assert output == approx(expected_output)
+    # each column with its own power
+    assert dp.power_(input_array, [.9, 2]) == approx(np.nan_to_num(np.power(input_array, [.9, 2])))
 
 
 def test_apply_apl_lagisint():
@@ -35,6 +68,160 @@ def test_apply_apl_series():
     pd.testing.assert_series_equal(output_single, dp.apply_apl_series(df, 0.5, .7, 1))
 
 
+def test_apply_apl_gradient():
+    input_list = [3., 0., 5., 2., 0., 0., 7., 1.]
+    transformed, adstock_gradient, power_gradient = dp.apply_apl_(input_list, .6, .7, 1.5, gradient=True)
+    assert transformed == approx(dp.apply_apl_(input_list, .6, .7, 1.5))
+    # same as central difference
+    step = 1e-6
+    assert adstock_gradient == approx((dp.apply_apl_(input_list, .6 + step, .7, 1.5) - dp.apply_apl_(input_list, .6 - step, .7, 1.5))
+                                      / (2 * step), rel=1e-6, abs=1e-8)
+    assert power_gradient == approx((dp.apply_apl_(input_list, .6, .7 + step, 1.5) - dp.apply_apl_(input_list, .6, .7 - step, 1.5))
+                                    / (2 * step), rel=1e-6, abs=1e-8)
+    # derivative with respect to adstock is previous decayed value when there is no decay
+    assert dp.apply_apl_(input_list, 0, 1, 0, gradient=True)[1] == approx([0., 3., 0., 5., 2., 0., 0., 7.])
+
+
+def test_apply_apl_gap():
+    input_list = [100., 50., np.nan, np.nan, 10., 0.]
+    # carry over restarts after gap or is held over gap
+    assert dp.apply_apl_(input_list, .5, 1, 0, gap="reset") == approx([100., 100., 0., 0., 10., 5.])
+    assert dp.apply_apl_(input_list, .5, 1, 0, gap="hold") == approx([100., 100., 0., 0., 60., 30.])
+    # same as transformation of each segment
+    input_matrix = np.array([[1., 4.], [np.nan, 3.], [3., 2.], [4., np.nan], [5., 6.]])
+    transformed = dp.apply_apl_matrix(input_matrix, [0, 1], [.5, .5], [1, 1], [0, 1], gap="reset")
+    assert transformed[:, 0] == approx(np.concatenate([dp.apply_apl_([1.], .5, 1, 0), [0.], dp.apply_apl_([3., 4., 5.], .5, 1, 0)]))
+    assert transformed[:, 1] == approx([0., 4., 5., 4.5, 0.])
+    # one pass on all columns
+    filtered = dp.recursive_filter_(np.ones((3, 2)), np.array([[.5, 0.], [.5, 1.], [.5, 0.]]))
+    assert filtered == approx(np.array([[1., 1.], [1.5, 2.], [1.75, 1.]]))
+
+
+def test_apply_apl_matrix():
+    input_matrix = np.array([[100., 4.], [50., 3.], [10., 2.], [0., 1.], [0., 0.], [0., 0.]])
+    spec = [(0, 0, 1, 0), (0, .5, 1, 0), (1, .5, .4, 2), (0, .5, .4, 2), (1, 0, 1, 1)]
+    output = dp.apply_apl_matrix(input_matrix, *zip(*spec))
+    # same output as transformation applied on each spec
+    for i, var in enumerate(spec):
+        assert output[:, i] == approx(dp.apply_apl_(input_matrix[:, var[0]], var[1], var[2], var[3]))
+    # panel axis in between time and variable axis
+    output = dp.apply_apl_matrix(np.stack([input_matrix, input_matrix[::-1]], axis=1), *zip(*spec))
+    assert output.shape == (6, 2, 5)
+    assert output[:, 1, 3] == approx(dp.apply_apl_(input_matrix[::-1, 0], .5, .4, 2))
+
+
+def test_convolve_():
+    input_matrix = np.array([[1., 4.], [2., 3.], [3., 2.], [4., 1.]])
+    # kernel weights
+    assert dp.adstock_kernel_(("geometric", .5), 4) == approx([1., .5, .25, .125])
+    assert dp.adstock_kernel_(("delayed", .5, 1), 4) == approx([.5, 1., .5, .0625])
+    assert dp.adstock_kernel_(("weibull", 1, 1), 3) == approx(np.exp(-np.arange(3.)))
+    assert len(dp.adstock_kernel_(("geometric", .1), 100)) == 11
+    # different kernel for each column in single convolution
+    convolved = dp.convolve_(input_matrix, [("geometric", .5), ("delayed", .5, 0)])
+    assert convolved == approx(np.array([[1., 4.], [2.5, 5.], [4.25, 3.75], [6.125, 2.1953125]]))
+    # kernel selected for each spec
+    all_vars = [('A', .5, 1, 0), ('A', ("geometric", .5), 1, 0), ('B', ("weibull", 2, 2), .5, 1)]
+    transformed = dp.apply_apl_frame(pd.DataFrame(input_matrix, columns=['A', 'B']), all_vars)
+    assert transformed[('A', ("geometric", .5), 1, 0)] == approx(transformed[('A', .5, 1, 0)])
+    assert transformed[('B', ("weibull", 2, 2), .5, 1)] == approx(np.sqrt([0., 4., 3. + 4. * np.exp(-.25), 2. + 3. * np.exp(-.25)
+                                                                           + 4. * np.exp(-1.)]))
+
+
+def test_apply_apl_frame():
+    df = pd.DataFrame({'two': [1., 2., 3., 4.], 'one': [4., 3., 2., 1.]}, index=['2', '5', '7', '9'])
+    all_vars = [('one', 0, 1, 0), ('two', .5, .7, 1), ('one', 0, 1, 1)]
+    expected_output = pd.concat([dp.apply_apl_series(df[var[0]], var[1], var[2], var[3]) for var in all_vars], axis=1)
+    expected_output.columns.names = ["Variable", "Adstock", "Power", "Lag"]
+    pd.testing.assert_frame_equal(dp.apply_apl_frame(df, all_vars).to_frame(), expected_output)
+    # specs shared across worker processes
+    pd.testing.assert_frame_equal(dp.apply_apl_frame(df, all_vars, n_jobs=2).to_frame(), expected_output)
+
+
+def test_apply_apl_panel():
+    # panels of unequal length
+    df_ind = [np.array(["METRO", "METRO", "METRO", "METRO", "REGIONAL", "REGIONAL", "VILLAGE"]),
+              np.array(["1/1/2018", "2/1/2018", "3/1/2018", "4/1/2018", "1/1/2018", "2/1/2018", "1/1/2018"])]
+    df = pd.DataFrame({'A': [773., 137., 508., 562., 500., 100., 773.],
+                       'B': [848., 326., 969., 730., 137., 508., 848.]}, index=df_ind)
+    all_vars = [('A', 0, 1, 0), ('A', .5, .7, 1), ('B', .5, 1, -1), ('B', 0, 1, -.5)]
+    df_grouped = df.groupby(df.droplevel(-1).index)
+    expected_output = pd.concat([df_grouped[var[0]].transform(
+        lambda x: dp.apply_apl_series(x, var[1], var[2], var[3])) for var in all_vars], axis=1)
+    expected_output.columns = pd.MultiIndex.from_tuples(all_vars, names=["Variable", "Adstock", "Power", "Lag"])
+    pd.testing.assert_frame_equal(dp.apply_apl_panel(df, all_vars).to_frame(), expected_output)
+    pd.testing.assert_frame_equal(dp.apply_apl_panel(df, all_vars, n_jobs=2).to_frame(), expected_output)
+    # lead does not pull values from padding
+    assert dp.apply_apl_panel(df, [('A', .5, 1, -1)]).to_frame().loc["REGIONAL"].values.ravel() == approx([350., 0.])
+
+
+def test_transformed_matrix():
+    df = pd.DataFrame({'two': [1., 2., 3., 4.], 'one': [4., 3., 2., 1.]}, index=['2', '5', '7', '9'])
+    all_vars = [('one', 0, 1, 0), ('two', .5, .7, 1), ('one', 0, 1, 1)]
+    transformed = dp.apply_apl_frame(df, all_vars)
+    assert transformed.shape == (4, 3)
+    assert [*transformed.spec["Variable"]] == ['one', 'two', 'one']
+    assert transformed.spec["Lag"].dtype == np.int64
+    # lookup by spec
+    assert transformed[('one', 0, 1, 1)] == approx([0., 4., 3., 2.])
+    assert transformed[[('one', 0, 1, 1), ('one', 0, 1, 0)]].shape == (4, 2)
+    subset = transformed.select([('two', .5, .7, 1)], rows=[1, 2])
+    assert subset.values == approx(np.array([[1.], [1.899144482]]))
+    assert [*subset.index] == ['5', '7']
+    # round trip to DataFrame
+    pd.testing.assert_frame_equal(TransformedMatrix.from_frame(transformed.to_frame()).to_frame(), transformed.to_frame())
+
+
+def test_apply_apl_layout():
+    layout = PanelLayout(np.array([[1., 4.], [2., 3.], [3., 2.], [4., 1.], [5., 0.]]), [0, 3, 5],
+                         pd.MultiIndex.from_arrays([["A", "A", "A", "B", "B"], [1, 2, 3, 2, 3]]), pd.Index(["one", "two"]))
+    assert [*layout.periods] == [3, 2]
+    assert [*layout.position] == [0, 1, 2, 0, 1]
+    assert layout.rows("B") == slice(3, 5)
+    assert layout.dense([1])[:, :, 0] == approx(np.array([[4., 1.], [3., 0.], [2., 0.]]))
+    transformed = dp.apply_apl_layout(layout, [('one', .5, 1, 0), ('two', 0, 1, -1)])
+    assert transformed.values == approx(np.array([[1., 3.], [2.5, 2.], [4.25, 0.], [4., 0.], [7., 0.]]))
+
+
+def test_transform_plan():
+    df = pd.DataFrame({'two': [1., 2., 3., 4.], 'one': [4., 3., 2., 1.]}, index=['2', '5', '7', '9'])
+    all_vars = [('one', .5, 1, 0), ('two', .5, .7, 1), ('one', .5, 1, 1), ('one', .5, .5, 0), ('two', 0, 1, 0), ('one', .5, 1, 0)]
+    plan = TransformPlan(all_vars)
+    # DAG of decay, power and lag steps
+    assert plan.decay_steps == [('one', .5), ('two', .5), ('two', 0)]
+    assert plan.power_steps == [(0, 1), (1, .7), (0, .5), (2, 1)]
+    assert plan.lag_steps == [(0, 0), (1, 1), (0, 1), (2, 0), (3, 0)]
+    assert plan.stats == {"requested": 6, "specs": 5, "decays": 3, "powers": 4, "reuse_ratio": .5}
+    # specs of same decay are not split
+    assert [[*batch] for batch in plan.batches(2)] == [[0, 2, 3], [1, 4]]
+    # duplicated specs in output
+    expected_output = dp.apply_apl_frame(df, all_vars).to_frame()
+    pd.testing.assert_frame_equal(plan.execute(df).to_frame(), expected_output)
+    pd.testing.assert_frame_equal(plan.execute(df, batch_size=2).to_frame(), expected_output)
+
+
+def test_transform_cache():
+    input_matrix = np.array([[100., 4.], [50., 3.], [10., 2.], [0., 1.], [0., 0.], [0., 0.]])
+    spec = [(0, .5, 1, 0), (0, .5, .4, 2), (0, .5, .4, 0), (1, 0, 1, 1)]
+    cache = TransformCache()
+    output = dp.apply_apl_matrix(input_matrix, *zip(*spec))
+    # same output with cache
+    assert dp.apply_apl_matrix(input_matrix, *zip(*spec), cache=cache) == approx(output)
+    assert (len(cache), cache.hits) == (5, 0)
+    # decay and power are reused on second pass
+    assert dp.apply_apl_matrix(input_matrix, *zip(*spec), cache=cache) == approx(output)
+    assert cache.hits == 3
+    assert dp.apply_apl_([100, 50, 10, 0, 0, 0], .5, .4, 2, cache=cache) == approx(output[:, 1])
+    assert cache.hits == 4
+    # least recently used series is evicted beyond byte budget
+    cache = TransformCache(max_bytes=2 * input_matrix[:, 0].nbytes)
+    dp.apply_apl_matrix(input_matrix, *zip(*spec), cache=cache)
+    assert len(cache) == 2
+    assert cache.nbytes <= cache.max_bytes
+    cache.clear()
+    assert (len(cache), cache.nbytes) == (0, 0)
+
+
 def test_segregate_variable():
     # simple case
     aggregated_data = pd.Series([51, 72, 51, 19, 47, 39, 33], pd.date_range("2020-01-01", "2020-01-07"), name="ABC")
@@ -2,6 +2,7 @@ import random
 
 import numpy as np
 import pandas as pd
+import pytest
 from pytest import approx
 
 import mrktmix as mmm
@@ -653,6 +654,10 @@ def test_apply_apl():
     expected_output = pd.DataFrame(expected_output)
     expected_output.columns.names = ['Variable', 'Adstock', 'Power', 'Lag']
     pd.testing.assert_frame_equal(mmm.apply_apl(df_1, panel_var), pd.DataFrame(expected_output))
+    # compact transformed matrix
+    transformed = mmm.apply_apl(df_1, panel_var, as_matrix=True)
+    assert isinstance(transformed, mmm.TransformedMatrix)
+    pd.testing.assert_frame_equal(transformed.to_frame(), pd.DataFrame(expected_output))
     # apply apl on pandas series
     panel_var = {"METRO": [('A', 0, 1, 0), ('B', 0, 1, 0), ('A', 0, 1, 1)], "REGIONAL": [('A', 0, 1, 2), ('A', 0, 1, 1)]}
     df_ind = [np.array(["METRO", "METRO", "METRO", "METRO", "METRO", "REGIONAL", "REGIONAL", "REGIONAL", "REGIONAL", "REGIONAL",
@@ -707,6 +712,46 @@ def test_apply_apl():
     expected_output = pd.DataFrame(expected_output)
     expected_output.columns.names = ['Variable', 'Adstock', 'Power', 'Lag']
     pd.testing.assert_frame_equal(mmm.apply_apl(df_2, panel_var).fillna(0), expected_output.fillna(0))
+    # panels transformed in worker processes
+    pd.testing.assert_frame_equal(mmm.apply_apl(df_2, panel_var, n_jobs=2).fillna(0), expected_output.fillna(0))
+
+
+def test_apply_apl_memmap(tmp_path):
+    df_ind = [np.repeat(["CITY", "METRO"], 6), np.tile(pd.date_range(start='1/1/2018', periods=6, freq="W"), 2)]
+    df = pd.DataFrame({'A': [773, 137, 508, 562, 365, 500, 100, 400, 79, 365, 773, 137],
+                       'B': [848, 326, 969, 730, 761, 137, 508, 562, 365, 761, 848, 326]}, index=df_ind)
+    all_vars = [('A', 0, 1, 0), ('A', .5, .7, 1), ('B', .3, .9, 0), ('B', 0, .5, 1.5), ('A', .5, .7, 0)]
+    for panel in [True, False]:
+        transformed = mmm.apply_apl_memmap(df, {panel: all_vars}, tmp_path / "transformed_{}.dat".format(panel), chunk_size=2)
+        assert isinstance(transformed.values, np.memmap)
+        pd.testing.assert_frame_equal(transformed.to_frame(), mmm.apply_apl(df, {panel: all_vars}))
+        # reopen file without copy
+        reopened = mmm.TransformedMatrix.open_memmap(tmp_path / "transformed_{}.dat".format(panel))
+        pd.testing.assert_frame_equal(reopened.to_frame(), mmm.apply_apl(df, {panel: all_vars}))
+
+
+def test_panel_layout():
+    # panels of different start date and length, rows of panels not stored together
+    df_ind = [np.array(["CITY", "METRO", "METRO", "CITY", "METRO", "CITY", "METRO"]),
+              pd.to_datetime(["1/8/2018", "1/1/2018", "1/8/2018", "1/15/2018", "1/15/2018", "1/22/2018", "1/22/2018"])]
+    df = pd.DataFrame({'A': [773., 137., 508., 562., 365., 500., 100.], 'B': [848., 326., 969., 730., 761., 137., 508.]}, index=df_ind)
+    df["Intercept"] = 1.
+    layout = mmm.PanelLayout.from_frame(df)
+    assert [*layout.offsets] == [0, 3, 7]
+    assert [*layout.panels] == ["CITY", "METRO"]
+    assert [*layout.order] == [0, 3, 5, 1, 2, 4, 6]
+    pd.testing.assert_frame_equal(layout.to_frame(), df.iloc[layout.order])
+    # transformation restarts at each offset
+    all_vars = [('A', .5, 1, 0), ('B', .3, .9, 1), ('A', 0, 1, -1)]
+    pd.testing.assert_frame_equal(mmm.apply_apl(layout, {True: all_vars}), mmm.apply_apl(df, {True: all_vars}).iloc[layout.order])
+    # decomposition and summary
+    coef_ind = [np.repeat(["CITY", "METRO"], 2), [("Intercept", 0, 1, 0), ("A", .5, 1, 0), ("Intercept", 0, 1, 0), ("B", .3, .9, 1)]]
+    coef = pd.Series([3240, 600, 10, 0.9], index=coef_ind)
+    dep = pd.Series([773., 137., 508., 562., 365., 500., 100.], index=df.index)
+    decomposition = mmm.apply_coef(layout, coef, dep_series=dep)
+    pd.testing.assert_frame_equal(decomposition.sort_index(), mmm.apply_coef(df, coef, dep_series=dep).sort_index())
+    date_dict = {'all': (pd.Timestamp('1/1/2018'), pd.Timestamp('1/22/2018'))}
+    pd.testing.assert_frame_equal(mmm.collapse_date(layout, date_dict), mmm.collapse_date(df, date_dict))
 
 
 def test_collapse_date():
@@ -771,6 +816,59 @@ def test_collapse_date():
     expected_output = pd.DataFrame(expected_output)
     expected_output.index.names = [None, "Variable", "Adstock", "Power", "Lag"]
     pd.testing.assert_frame_equal(mmm.collapse_date(dep_decompose, date_dict), expected_output)
+    # overlapping periods on unsorted rows
+    date_dict = {'all': ('1/1/2018', '5/1/2018'), 'first': ('1/1/2018', '2/1/2018'), 'second': ('2/1/2018', '3/1/2018')}
+    collapsed = mmm.collapse_date(df_2.iloc[::-1], date_dict)
+    for key, val in date_dict.items():
+        pd.testing.assert_series_equal(collapsed[key], mmm.collapse_date(df_2.iloc[::-1], {key: val})[key])
+    assert [*collapsed.index.get_level_values(0).unique()] == ["VILLAGE", "REGIONAL", "METRO"]
+    pd.testing.assert_series_equal(collapsed["all"].sort_index(), mmm.collapse_date(df_2, date_dict)["all"])
+
+
+def test_range_summary():
+    df_ind = [np.repeat(["CITY", "METRO"], 4), pd.to_datetime(["1/1/2018", "1/8/2018", "1/15/2018", "1/22/2018"] * 2)]
+    df = pd.DataFrame({'A': [773., 137., 508., 562., 365., 500., 100., 420.], 'B': [848., 326., np.nan, 730., 761., 137., 508., 250.]},
+                      index=df_ind)
+    range_summary = mmm.RangeSummary(df)
+    pd.testing.assert_frame_equal(range_summary.total("1/8/2018", "1/15/2018"),
+                                  pd.DataFrame({'A': [645., 600.], 'B': [326., 645.]}, index=["CITY", "METRO"]))
+    # batch of ranges, including range before first date and empty range
+    start = pd.to_datetime(["1/1/2018", "1/8/2018", "12/1/2017", "1/10/2018"])
+    end = pd.to_datetime(["1/22/2018", "1/8/2018", "1/1/2018", "1/12/2018"])
+    totals = range_summary.query(start, end)
+    assert totals.shape == (4, 2, 2)
+    for i in range(len(start)):
+        selected = (df.index.get_level_values(-1) >= start[i]) & (df.index.get_level_values(-1) <= end[i])
+        np.testing.assert_allclose(totals[i], df[selected].groupby(level=0).sum().reindex(["CITY", "METRO"]).fillna(0))
+    assert range_summary.count(start, end).tolist() == [[4, 4], [1, 1], [1, 1], [0, 0]]
+    # without panel
+    assert range_summary.total("1/8/2018", "1/15/2018").shape == (2, 2)
+    assert mmm.RangeSummary(df.loc["CITY"]).total("1/8/2018", "1/15/2018").tolist() == [645., 326.]
+
+
+def test_summarize_coef():
+    # panels of different periods
+    df_date = ["1/1/2018", "1/8/2018", "1/15/2018", "1/22/2018", "1/15/2018", "1/22/2018", "2/1/2018", "2/8/2018"]
+    df_ind = [np.repeat(["CITY", "METRO"], 4), pd.to_datetime(df_date)]
+    df = pd.DataFrame({'A': [773., 137., 508., 562., 365., 500., 100., 420.], 'B': [848., 326., np.nan, 730., 761., 137., 508., 250.]},
+                      index=df_ind)
+    df["Intercept"] = 1.
+    coef_var = [("Intercept", 0, 1, 0), ("A", .5, 1, 0), ("B", 0, 1, 0), ("Intercept", 0, 1, 0), ("B", .3, .9, 1), ("A", 0, .5, 0)]
+    coef_ind = [np.repeat(["CITY", "METRO"], 3), coef_var]
+    coef = pd.Series([3240, 600, 2, 10, 0.9, 4], index=coef_ind)
+    dep = pd.Series([773., 137., 508., 562., 365., 500., 100., 420.], index=df.index)
+    date_dict = {'jan': (pd.Timestamp('1/1/2018'), pd.Timestamp('1/31/2018')),
+                 'mid': (pd.Timestamp('1/8/2018'), pd.Timestamp('1/22/2018')),
+                 'feb': (pd.Timestamp('2/1/2018'), pd.Timestamp('2/28/2018'))}
+    expected_output = mmm.collapse_date(mmm.apply_coef(df, coef, dep_series=dep), date_dict)
+    pd.testing.assert_frame_equal(mmm.summarize_coef(df, coef, date_dict, dep_series=dep), expected_output)
+    pd.testing.assert_frame_equal(mmm.summarize_coef(df, coef, date_dict, dep_series=dep, batch_size=1), expected_output)
+    pd.testing.assert_frame_equal(mmm.summarize_coef(mmm.PanelLayout.from_frame(df), coef, date_dict, dep_series=dep), expected_output)
+    transformed = mmm.apply_apl(df, {True: [*coef.index.get_level_values(-1)]}, as_matrix=True)
+    pd.testing.assert_frame_equal(mmm.summarize_coef(transformed, coef, date_dict), mmm.collapse_date(mmm.apply_coef(df, coef), date_dict))
+    # without panel
+    pd.testing.assert_frame_equal(mmm.summarize_coef(df.loc["CITY"], coef["CITY"], date_dict, dep_series=dep["CITY"]),
+                                  mmm.collapse_date(mmm.apply_coef(df.loc["CITY"], coef["CITY"], dep_series=dep["CITY"]), date_dict))
 
 
 def test_assess_error():
@@ -793,6 +891,65 @@ def test_assess_error():
     pd.testing.assert_frame_equal(mmm.assess_error(mmm.apply_coef(df, coef, dep_series=dep["Dep"])).round(4), expected_output.round(4))
 
 
+def test_assess_models():
+    df_ind = [np.repeat(["CITY", "METRO"], 4), np.tile(pd.date_range(start='1/1/2018', end='1/04/2018'), 2)]
+    dep = pd.Series([10., 12., 14., 11., 20., 22., 21., np.nan], index=df_ind)
+    predictions = pd.DataFrame({'perfect': dep, 'mean': [11.75] * 4 + [21.] * 4, 'model': [9., 13., 13., 12., 21., 21., 22., 25.]},
+                               index=df_ind)
+    statistics = mmm.assess_models(dep.iloc[::-1], predictions, n_params=1)
+    assert statistics["Observations"].tolist() == [7, 7, 7]
+    assert statistics.loc["perfect", ["MAPE", "RMSE", "R2"]].tolist() == [0, 0, 1]
+    model_error = np.array([1., -1., 1., -1., -1., 1., -1.])
+    assert statistics.loc["model", "RMSE"] == approx(1)
+    assert statistics.loc["model", "MAPE"] == approx(np.mean(np.abs(model_error) / dep.dropna()))
+    assert statistics.loc["model", "R2"] == approx(1 - 7 / ((dep - dep.mean())**2).sum())
+    assert statistics.loc["model", "Adjusted R2"] == approx(1 - (1 - statistics.loc["model", "R2"]) * 6 / 5)
+    # consecutive errors within panel only
+    assert statistics.loc["model", "Durbin Watson"] == approx((4 * 3 + 4 * 2) / 7)
+    # per panel
+    statistics = mmm.assess_models(dep, predictions, by_panel=True)
+    assert statistics.loc[("CITY", "mean"), "R2"] == approx(0)
+    assert statistics.loc[("METRO", "model"), "Observations"] == 3
+    assert statistics.loc[("METRO", "model"), "Durbin Watson"] == approx(8 / 3)
+    assert statistics["Adjusted R2"].isna().all()
+
+
+def least_squares_fit(transformed, dep_series, coef):
+    # refit coefficient of every panel on training rows
+    all_coef = []
+    for panel in coef.index.get_level_values(0).unique():
+        rows = transformed.index.get_level_values(0) == panel
+        x_data = transformed.select([*coef[panel].index], rows=rows).values
+        all_coef.append(np.linalg.lstsq(x_data, dep_series[rows].to_numpy(), rcond=None)[0])
+    return(pd.Series(np.concatenate(all_coef), index=coef.index))
+
+
+def test_backtest():
+    df_ind = pd.MultiIndex.from_product([["CITY", "METRO"], pd.date_range(start='1/7/2018', periods=12, freq="W")])
+    df = pd.DataFrame({'A': [773, 137, 508, 562, 365, 500, 100, 400, 79, 365, 773, 137] * 2,
+                       'B': [848, 326, 969, 730, 761, 137, 508, 562, 365, 761, 848, 326] * 2}, index=df_ind)
+    df["Intercept"] = 1
+    all_vars = [("Intercept", 0, 1, 0), ("A", .5, 1, 0), ("B", .3, .8, 1)]
+    coef = pd.Series([10., 2., 5., 20., 1., 4.], index=[np.repeat(["CITY", "METRO"], 3), all_vars * 2])
+    dep = mmm.apply_coef(df, coef).sum(axis=1) + np.tile([3., -2., 1., -4.], 6)
+    origins = [pd.Timestamp('2/25/2018'), pd.Timestamp('3/11/2018')]
+    statistics = mmm.backtest(df, coef, dep, origins, horizon=2)
+    assert statistics["Origin"].tolist() == [origins[0], origins[0], origins[1], origins[1]]
+    assert statistics["Sample"].tolist() == ["Train", "Test", "Train", "Test"]
+    assert statistics["Observations"].tolist() == [16, 4, 20, 4]
+    error = dep - mmm.apply_coef(df, coef).sum(axis=1)
+    test_rows = (df.index.get_level_values(-1) > origins[1]) & (df.index.get_level_values(-1) <= pd.Timestamp('3/25/2018'))
+    assert statistics["RMSE"].iloc[3] == approx(np.sqrt((error[test_rows]**2).mean()))
+    # refit on training periods of every fold in worker processes
+    statistics = mmm.backtest(df, coef, dep, origins, horizon=2, fit=least_squares_fit, n_jobs=2, by_panel=True)
+    assert statistics["Panel"].tolist() == ["CITY", "METRO"] * 4
+    train_rows = df.index.get_level_values(-1) <= origins[1]
+    transformed = mmm.apply_apl(df, {True: all_vars}, as_matrix=True)
+    refit_coef = least_squares_fit(transformed.select(rows=train_rows), dep[train_rows], coef)
+    error = (dep - mmm.apply_coef(df, refit_coef).sum(axis=1))["METRO"]
+    assert statistics["RMSE"].iloc[7] == approx(np.sqrt((error[test_rows[12:]]**2).mean()))
+
+
 def test_aggregate_data():
     # input data
     input_df = pd.DataFrame(np.array([[35, 96, 16, 60, 81],
@@ -1655,6 +1812,28 @@ def test_apply_coef():
     pd.testing.assert_frame_equal(mmm.apply_coef(df_2, coef_input, nodes=node_input), output)
 
 
+def test_apply_coef_parallel():
+    # network of two panels, node A explained by B in each panel
+    df_ind = [np.repeat(["CITY", "METRO"], 4), pd.to_datetime(["1/1/2018", "1/8/2018", "1/15/2018", "1/22/2018"] * 2)]
+    df = pd.DataFrame({'A': [773., 137., 508., 562., 365., 500., 100., 420.], 'B': [848., 326., 969., 730., 761., 137., 508., 250.]},
+                      index=df_ind)
+    df["Dep"] = df["A"] + df["B"]
+    df["Intercept"] = 1.
+    coef_ind = [np.repeat(["CITY", "METRO"], 4), [("Intercept", 0, 1, 0), ("A", .5, 1, 0), ("Intercept", 0, 1, 0), ("B", .3, .9, 1)] * 2]
+    coef = pd.Series([3240, 600, 10, 0.9, 3000, 500, 20, 0.8], index=coef_ind)
+    nodes = pd.Series([("Dep", 0, 1, 0), ("Dep", 0, 1, 0), ("A", .5, 1, 0), ("A", .5, 1, 0)] * 2, index=coef_ind)
+    decomposition = mmm.apply_coef(df, coef, nodes=nodes)
+    pd.testing.assert_frame_equal(mmm.apply_coef(df, coef, nodes=nodes, n_jobs=2), decomposition)
+    assert decomposition.attrs["failed_panels"] == {}
+    # failed panel is reported and remaining panels are decomposed
+    with pytest.warns(UserWarning, match="METRO"):
+        partial_decomposition = mmm.apply_coef(df, coef["CITY":"CITY"], nodes=nodes, n_jobs=2, errors="warn")
+    assert [*partial_decomposition.attrs["failed_panels"]] == ["METRO"]
+    pd.testing.assert_frame_equal(partial_decomposition, decomposition.loc[["CITY"]])
+    with pytest.raises(KeyError):
+        mmm.apply_coef(df, coef["CITY":"CITY"], nodes=nodes)
+
+
 def test_optimize():
     coef = [47, 75, 13, 63, 96, 25, 17]
     intial_spend = [806, 332, 173, 661, 286, 253, 978]
@@ -1711,3 +1890,27 @@ def test_optimize():
     assert optim_result[0] == approx(optimized_spend)
     assert optim_result[1] == 33289.46249496577
     assert not optim_result[2]
+
+
+def test_float32_tolerance():
+    # float32 output must be within relative tolerance of 1e-5 from float64 output
+    df_ind = [np.repeat(["CITY", "METRO"], 6), np.tile(pd.date_range(start='1/1/2018', periods=6, freq="W"), 2)]
+    df = pd.DataFrame({'A': [773, 137, 508, 562, 365, 500, 100, 400, 79, 365, 773, 137],
+                       'B': [848, 326, 969, 730, 761, 137, 508, 562, 365, 761, 848, 326]}, index=df_ind)
+    df["Intercept"] = 1
+    all_vars = [('Intercept', 0, 1, 0), ('A', .5, .7, 1), ('B', .3, .9, 0), ('B', 0, .5, 1.5)]
+    # transformation
+    transformed = mmm.apply_apl(df, {True: all_vars}, dtype=np.float32)
+    assert (transformed.dtypes == np.float32).all()
+    pd.testing.assert_frame_equal(transformed, mmm.apply_apl(df, {True: all_vars}), check_dtype=False, rtol=1e-5)
+    # decomposition
+    coef = pd.Series([.2, .3, .4, .5, .2, .3, .4, .5], index=[np.repeat(["CITY", "METRO"], 4), all_vars * 2])
+    dep = df["A"] * 3. + 2000
+    decomposition = mmm.apply_coef(df, coef, dep_series=dep, dtype=np.float32)
+    assert (decomposition.dtypes == np.float32).all()
+    pd.testing.assert_frame_equal(decomposition, mmm.apply_coef(df, coef, dep_series=dep), check_dtype=False, rtol=1e-5)
+    # aggregation
+    aggregated = mmm.aggregate_data(df, panel_agg={"NATIONAL": ["CITY", "METRO"]}, dtype=np.float32)
+    assert (aggregated.dtypes == np.float32).all()
+    pd.testing.assert_frame_equal(aggregated, mmm.aggregate_data(df, panel_agg={"NATIONAL": ["CITY", "METRO"]}),
+                                  check_dtype=False, rtol=1e-5)
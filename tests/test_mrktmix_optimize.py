@@ -30,3 +30,35 @@ def test_optmization():
     optimized_spend = [869.72435105, 265.6, 138.4, 528.8, 228.8, 202.4, 782.4]
     assert optim_result.x == approx(optimized_spend)
     assert optim_result.success
+
+
+def test_kkt_optimization():
+    coef = [47, 75, 13, 63, 96, 25, 17]
+    intial_spend = [806, 332, 173, 661, 286, 253, 978]
+    power = [0.9, 0.32, 0.97, 0.53, 0.02, 0.86, 0.67]
+    lb = [644.8, 265.6, 138.4, 528.8, 228.8, 202.4, 782.4]
+    ub = [967.2, 398.4, 207.6, 793.2, 343.2, 303.6, 1173.6]
+    optim_result = optim.optimization(coef, intial_spend, power, lb, ub, 3489, contraint_type='budget', method='kkt')
+    assert optim_result.x == approx([967.2, 265.6, 207.6, 733.8, 228.8, 303.6, 782.4])
+    assert sum(optim_result.x) == approx(3489)
+    assert optim_result.success
+
+    optim_result = optim.optimization(coef, intial_spend, power, lb, ub, 28511.75, contraint_type='revenue', method='kkt')
+    assert optim_result.x == approx([869.72435105, 265.6, 138.4, 528.8, 228.8, 202.4, 782.4])
+    assert optim_result.success
+
+    # budget is not attainable within bounds
+    optim_result = optim.optimization(coef, intial_spend, power, lb, ub, 5000, contraint_type='budget', method='kkt')
+    assert optim_result.x == approx(ub)
+    assert not optim_result.success
+
+    # marginal revenue of every channel within bounds is equal at optimum
+    optim_result = optim.optimization(coef, intial_spend, power, [0] * 7, [1e4] * 7, 3489, contraint_type='budget', method='kkt')
+    marginal_revenue = [c * p * x**(p - 1) for c, p, x in zip(coef, power, optim_result.x)]
+    assert marginal_revenue == approx([optim_result.multiplier] * 7)
+
+    # SLSQP for power above 1
+    power[0] = 1.2
+    optim_result = optim.optimization(coef, intial_spend, power, lb, ub, 3489, contraint_type='budget', method='kkt')
+    assert optim_result.x == approx(optim.optimization(coef, intial_spend, power, lb, ub, 3489, contraint_type='budget').x)
+    assert "multiplier" not in optim_result
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+import mrktmix as mmm
+
+
+def test_streaming_apl(tmp_path):
+    all_vars = [('A', 0, 1, 0), ('A', .5, .7, 1), ('B', .5, 1, 0), ('B', 0, .9, 1.5)]
+    # without panel
+    df = pd.DataFrame({'A': [773., 137., 508., 562., 365., 500.], 'B': [848., 326., 969., 730., 761., 137.]},
+                      index=pd.date_range(start='1/1/2018', periods=6, freq="W"))
+    expected_output = mmm.apply_apl(df, {False: all_vars})
+    streaming_apl = mmm.StreamingApl(all_vars)
+    output = pd.concat([streaming_apl.fit(df.iloc[:2]), streaming_apl.update(df.iloc[2:3]), streaming_apl.update(df.iloc[3:])])
+    pd.testing.assert_frame_equal(output, expected_output)
+    # with panel, new panel in update and state restored from file
+    df_ind = [np.repeat(["METRO", "REGIONAL"], 6), np.tile(pd.date_range(start='1/1/2018', periods=6, freq="W"), 2)]
+    df = pd.DataFrame({'A': [773., 137., 508., 562., 365., 500., 100., 400., 79., 365., 773., 137.],
+                       'B': [848., 326., 969., 730., 761., 137., 508., 562., 365., 761., 848., 326.]}, index=df_ind)
+    expected_output = mmm.apply_apl(df, {True: all_vars})
+    streaming_apl = mmm.StreamingApl(all_vars)
+    history = streaming_apl.fit(df.loc[["METRO"]].iloc[:4])
+    streaming_apl.save(tmp_path / "state.pkl")
+    streaming_apl = mmm.StreamingApl.load(tmp_path / "state.pkl")
+    output = pd.concat([history, streaming_apl.update(df.iloc[[4, 6, 7]]), streaming_apl.update(df.iloc[[5, 8, 9, 10, 11]])])
+    pd.testing.assert_frame_equal(output.reindex(df.index), expected_output)
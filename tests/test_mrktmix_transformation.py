@@ -75,6 +75,9 @@ def test_apply_coef_():
     expected_output = pd.DataFrame(expected_output)
     expected_output.columns.names = ["Variable", "Adstock", "Power", "Lag"]
     pd.testing.assert_frame_equal(dp.apply_coef_(df_2, coef_2, df_2["A"]), expected_output)
+    # with transformed matrix
+    transformed = dp.apply_apl(df_2, {False: [("B", 0, 1, 0), ("Intercept", 0, 1, 0), ("A", 0, 1, 0), ("D", 0, 1, 0)]}, as_matrix=True)
+    pd.testing.assert_frame_equal(dp.apply_coef_(transformed, coef_2, df_2["A"]), expected_output)
 
     # without dependent with panel
     coef_ind = [["METRO", "METRO", "METRO", "METRO", "REGIONAL", "REGIONAL", "REGIONAL", "REGIONAL", "VILLAGE", "VILLAGE", "VILLAGE",
@@ -250,6 +253,13 @@ def test_apply_coef_():
     expected_output = pd.DataFrame(expected_output)
     expected_output.columns.names = ["Variable", "Adstock", "Power", "Lag"]
     pd.testing.assert_frame_equal(dp.apply_coef_(df_2, coef_2, dep["Dep"]), expected_output)
+    # exactly same as multiplication of DataFrame aligned on panel
+    after_apl = dp.apply_apl(df_2, pd.Series(coef_2.index.get_level_values(-1)).groupby(coef_2.droplevel(-1).index).apply(list).to_dict())
+    coef2frame = coef_2.unstack()
+    coef2frame.columns = pd.MultiIndex.from_tuples(coef2frame.columns)
+    expected_output = after_apl[coef2frame.columns].mul(coef2frame.reindex(after_apl.index, level=0))
+    expected_output[("Residual", 0, 1, 0)] = dep["Dep"] - expected_output.sum(axis=1)
+    pd.testing.assert_frame_equal(dp.apply_coef_(df_2, coef_2, dep["Dep"]), expected_output, check_exact=True)
 
 
 def test_apply_coef_node_():
@@ -464,3 +474,6 @@ def test_apply_coef_node_():
                                                              (('C', 0, 1, 0), 'Residual', 0, 1, 0)],
                                                             names=[None, 'Variable', 'Adstock', 'Power', 'Lag']))
     pd.testing.assert_frame_equal(dp.apply_coef_node_(df_2, coef_input, node_input, node_input[11], 0), output)
+    # drivers and node taken from shared transformed block
+    transformed = dp.apply_apl(df_2, {True: [*dict.fromkeys([*coef_input.index.get_level_values(-1)] + [*node_input])]}, as_matrix=True)
+    pd.testing.assert_frame_equal(dp.apply_coef_node_(transformed, coef_input, node_input, node_input[11], 0), output)